@@ -30,6 +30,7 @@ from shared import config
 from shared import debug
 
 # local classes
+from pairpool import PairPool
 
 # constants
 
@@ -49,6 +50,7 @@ CELL_MEM = config.cell_memory_time
 CELL_QUAL = config.cell_qualifying_triggers
 CELL_AGE = config.cell_max_age
 CELL_LAT = config.cell_latitude
+CELL_PERIOD = config.cell_eval_period
 
 CONX_MIN = config.connector_avg_min
 CONX_AVG = config.connector_avg_triggers
@@ -56,6 +58,12 @@ CONX_MEM = config.connector_memory_time
 CONX_QUAL = config.connector_qualifying_triggers
 CONX_AGE = config.connector_max_age
 CONX_LAT = config.connector_latitude
+CONX_PERIOD = config.connector_eval_period
+
+EVALS_PER_MEM = config.evals_per_memory_time
+MAX_PERIOD = config.max_eval_period
+
+WORKERS = config.conductor_workers
 
 # init debugging
 dbug = debug.Debug()
@@ -68,6 +76,12 @@ class Conductor(object):
         m_field: store a back ref to the field that called us
         connector_tests: an indexed list of handlers for testing connectors
         m_avg_table: keeps an indexed list of running averages
+        m_score_table: the last result of each test (indexed like avg_table)
+        m_slot_table: round-robin slot of each test (indexed like avg_table)
+        m_evaltick_table: tick each test was last evaluated
+        m_cell_indexes: the indexes in the three tables above that belong
+            to each cell, alone or in a pair, so they can go when it does
+        m_pool: pool of worker processes for pair tests (or None)
 
     send_rollcall: send the current rollcall to concerned systems
 
@@ -88,9 +102,18 @@ class Conductor(object):
             triggers the attribute
         5. The "max_age" or how long the attribute stays around once 
             triggered (it diminishes to 0 in this time)
+
+    Tests with a long memory_time are not evaluated every frame. Each test
+    type has an evaluation period (in frames), either configured in
+    eval_period or derived from memory_time. Each cell or pair gets a
+    round-robin slot so that the slow tests are spread evenly across
+    frames. In between, the last result of the test is reused, and when it is
+    evaluated, the running average is advanced by the number of frames
+    skipped.
     """
 
-    def __init__(self, field=None, condglobal=1, cellglobal=1):
+    def __init__(self, field=None, condglobal=1, cellglobal=1,
+                 workers=WORKERS):
         self.m_field = field
         self.m_condglobal = condglobal
         self.m_cellglobal = cellglobal
@@ -135,6 +158,18 @@ class Conductor(object):
 
         self.m_avg_table = {}
         self.m_dist_table = {}
+        self.m_score_table = {}
+        self.m_slot_table = {}
+        self.m_evaltick_table = {}
+        self.m_cell_indexes = {}
+        self.m_next_slot = 0
+        self.m_cell_tick = 0
+        self.m_conx_tick = 0
+        # optional pool of processes for evaluating connector tests
+        if workers:
+            self.m_pool = PairPool(workers)
+        else:
+            self.m_pool = None
 
     def update(self, field=None, condglobal=None, cellglobal=None):
         if field!=None:
@@ -156,6 +191,8 @@ class Conductor(object):
             mod_array = CELL_AGE
         elif param == "qual":
             mod_array = CELL_QUAL
+        elif param == "period":
+            mod_array = CELL_PERIOD
         if mod_array is not None:
             mod_array[type] = value
             
@@ -177,10 +214,66 @@ class Conductor(object):
         elif param == "qualmin":
             mod_array = CONX_QUAL
             type=type+"-min"
+        elif param == "period":
+            mod_array = CONX_PERIOD
         if mod_array is not None:
             mod_array[type] = value
 
 
+    #
+    # Test scheduling
+    #
+
+    def eval_period(self, type, period_table, mem_table):
+        """How many frames between evaluations of this type of test.
+
+        If the period is not configured, we derive it from the memory time so
+        that we take about EVALS_PER_MEM samples over the memory.
+        """
+        if type in period_table:
+            period = period_table[type]
+        else:
+            if type in mem_table:
+                mem_time = mem_table[type]
+            else:
+                mem_time = mem_table[DEFAULT]
+            period = float(mem_time)*FRAMERATE/EVALS_PER_MEM
+        return int(max(1, min(MAX_PERIOD, period)))
+
+    def eval_steps(self, index, period, tick, uids):
+        """Is this test due on this tick?
+
+        Returns 0 if the test should be skipped this tick, otherwise the
+        number of frames since it was last evaluated (which the running
+        average must make up for). A test we haven't seen before is evaluated
+        right away. uids are the cells the test is of.
+        """
+        if index not in self.m_slot_table:
+            self.m_slot_table[index] = self.m_next_slot
+            self.m_next_slot += 1
+            for uid in uids:
+                self.m_cell_indexes.setdefault(uid, set()).add(index)
+        if index not in self.m_evaltick_table:
+            self.m_evaltick_table[index] = tick
+            return 1
+        if (self.m_slot_table[index] + tick) % period:
+            return 0
+        steps = min(period, tick - self.m_evaltick_table[index])
+        self.m_evaltick_table[index] = tick
+        return max(1, steps)
+
+    def forget_gone_cells(self):
+        """Drop the table entries of cells that have gone, and their pairs.
+
+        If a cell comes back, its tests start over as if they were new.
+        """
+        for uid in self.m_cell_indexes.keys():
+            if uid not in self.m_field.m_cell_dict:
+                for index in self.m_cell_indexes.pop(uid):
+                    self.m_score_table.pop(index, None)
+                    self.m_slot_table.pop(index, None)
+                    self.m_evaltick_table.pop(index, None)
+
     #
     # Connection housekeeping
     #   Yes, I know this shoud be refactored so that cell and conx are the same
@@ -199,10 +292,82 @@ class Conductor(object):
                   update the value?
         anything else? they should be picked up when the conductor does its
         regular reports
+
+        All the tests are scored before any triggers are evaluated, so the
+        scores only depend on the state at the start of the frame, whether
+        they are computed here or sharded across the worker pool.
         """
 
         if dbug.LEV & dbug.MORE: 
             print "Conduct:update_all_conx"
+        self.m_conx_tick += 1
+        self.forget_gone_cells()
+        pairs = self.find_pairs()
+        if self.m_pool is not None and \
+                self.m_pool.is_usable(len(self.m_field.m_cell_dict)):
+            self.m_pool.score_pairs(self, pairs)
+        else:
+            self.score_pairs(pairs)
+        for (cid,cell0,cell1,due) in pairs:
+            uid0 = cell0.m_id
+            uid1 = cell1.m_id
+            for type in self.conx_tests:
+                index = str(cid)+'-'+str(type)
+                running_avg = self.m_score_table[index] * \
+                        self.m_condglobal
+                if type in CONX_AVG:
+                    avg_trigger = CONX_AVG[type]
+                else:
+                    avg_trigger = CONX_AVG[DEFAULT]
+                if dbug.LEV & dbug.COND & dbug.MORE: 
+                    #if running_avg and avg_trigger:
+                    if running_avg >= min(avg_trigger,CONX_MIN):
+                        print "Conduct:update_conx:post_test:id:", \
+                                "%s-%s %.2f"%(cid,type,running_avg), \
+                                "(trigger:%.2f)"%avg_trigger
+                # if running_avg is above trigger
+                if running_avg >= avg_trigger:
+                    #if dbug.LEV & dbug.MORE: 
+                        #print "Conduct:update_conx:results:%s-%s,%s,%s"% \
+                                #(cell0.m_id, cell1.m_id, type, running_avg)
+                    # if a connection/attr does not already exist already
+                    if not self.m_field.check_for_conx_attr(uid0, uid1, type):
+                        if dbug.LEV & dbug.COND: 
+                            print "Conduct:update_conx:triggered:id:", \
+                                "%s-%s avg (%.3f) >="%(cid,type,running_avg), \
+                                "trigger (%.3f)"%avg_trigger
+                    # create one
+                    self.m_field.update_conx_attr(cid, uid0, uid1, type, running_avg)
+                    #else:
+                        #if dbug.LEV & dbug.MORE: 
+                            #print "Conduct:update_conx:already there, bro"
+                # if running_avg is under trigger value 
+                else:
+                    if type in CONX_AGE:
+                        max_age = CONX_AGE[type]
+                    else:
+                        max_age = CONX_AGE[DEFAULT]
+                    #   AND decay time is zero, kill it
+                    if not max_age:
+                        if self.m_field.check_for_conx_attr(uid0, uid1, type):
+                            if dbug.LEV & dbug.COND: 
+                                print "Conduct:update_conx:delete happening:",cid,type," avg(%.2f) < trigger (%.2f)"%(running_avg, avg_trigger)
+                            # send "del conx" osc msg
+                            self.m_field.m_osc.nix_conx_attr(cid, type)
+                            # delete attr and maybe conx
+                            self.m_field.del_conx_attr(cid, type)
+                            index = str(cid)+'-'+str(type)
+                            # actually we want to keep the avg
+                            #if index in self.m_avg_table:
+                                #del self.m_avg_table[index]
+
+    def find_pairs(self):
+        """Find the pairs of good cells and the tests due for each.
+
+        Returns a list of (cid, cell0, cell1, due) where due is a list of
+        (type, steps) for the tests to be evaluated this frame.
+        """
+        pairs = []
         for (cell0,cell1) in list(combinations(self.m_field.m_cell_dict.values(), 2)):
             uid0 = cell0.m_id
             uid1 = cell1.m_id
@@ -210,67 +375,43 @@ class Conductor(object):
                     self.m_field.is_cell_good_to_go(cell1.m_id):
                 # get cid
                 cid = self.m_field.get_cid(uid0, uid1)
-                # calc distance once
-                self.m_dist_table[cid] = self.dist(cell0, cell1)
-                for type,conx_test in self.conx_tests.iteritems():
-                    running_avg = conx_test(cid, type, cell0, cell1) * \
-                            self.m_condglobal
-                    if type in CONX_AVG:
-                        avg_trigger = CONX_AVG[type]
-                    else:
-                        avg_trigger = CONX_AVG[DEFAULT]
-                    if dbug.LEV & dbug.COND & dbug.MORE: 
-                        #if running_avg and avg_trigger:
-                        if running_avg >= min(avg_trigger,CONX_MIN):
-                            print "Conduct:update_conx:post_test:id:", \
-                                    "%s-%s %.2f"%(cid,type,running_avg), \
-                                    "(trigger:%.2f)"%avg_trigger
-                    # if running_avg is above trigger
-                    if running_avg >= avg_trigger:
-                        #if dbug.LEV & dbug.MORE: 
-                            #print "Conduct:update_conx:results:%s-%s,%s,%s"% \
-                                    #(cell0.m_id, cell1.m_id, type, running_avg)
-                        # if a connection/attr does not already exist already
-                        if not self.m_field.check_for_conx_attr(uid0, uid1, type):
-                            if dbug.LEV & dbug.COND: 
-                                print "Conduct:update_conx:triggered:id:", \
-                                    "%s-%s avg (%.3f) >="%(cid,type,running_avg), \
-                                    "trigger (%.3f)"%avg_trigger
-                        # create one
-                        self.m_field.update_conx_attr(cid, uid0, uid1, type, running_avg)
-                        #else:
-                            #if dbug.LEV & dbug.MORE: 
-                                #print "Conduct:update_conx:already there, bro"
-                    # if running_avg is under trigger value 
-                    else:
-                        if type in CONX_AGE:
-                            max_age = CONX_AGE[type]
-                        else:
-                            max_age = CONX_AGE[DEFAULT]
-                        #   AND decay time is zero, kill it
-                        if not max_age:
-                            if self.m_field.check_for_conx_attr(uid0, uid1, type):
-                                if dbug.LEV & dbug.COND: 
-                                    print "Conduct:update_conx:delete happening:",cid,type," avg(%.2f) < trigger (%.2f)"%(running_avg, avg_trigger)
-                                # send "del conx" osc msg
-                                self.m_field.m_osc.nix_conx_attr(cid, type)
-                                # delete attr and maybe conx
-                                self.m_field.del_conx_attr(cid, type)
-                                index = str(cid)+'-'+str(type)
-                                # actually we want to keep the avg
-                                #if index in self.m_avg_table:
-                                    #del self.m_avg_table[index]
-
-    def record_conx_avg(self, id, type, sample):
+                due = []
+                for type in self.conx_tests:
+                    index = str(cid)+'-'+str(type)
+                    period = self.eval_period(type, CONX_PERIOD, CONX_MEM)
+                    steps = self.eval_steps(index, period, self.m_conx_tick,
+                                            (uid0, uid1))
+                    if steps:
+                        due.append((type, steps))
+                pairs.append((cid, cell0, cell1, due))
+        return pairs
+
+    def score_pairs(self, pairs):
+        """Run the due tests for each pair and record the scores.
+
+        Tests that are not due keep their last score.
+        """
+        for (cid,cell0,cell1,due) in pairs:
+            # calc distance once
+            self.m_dist_table[cid] = self.dist(cell0, cell1)
+            for (type,steps) in due:
+                self.m_score_table[str(cid)+'-'+str(type)] = \
+                        self.conx_tests[type](cid, type, cell0, cell1, steps)
+
+    def record_conx_avg(self, id, type, sample, steps=1):
         """Track Exponentially decaying weighted moving averages (ema) in an 
-        indexed dict."""
+        indexed dict.
+
+        steps is the number of frames this sample stands for, when the test
+        isn't evaluated every frame."""
         index = str(id)+'-'+str(type)
         if type in CONX_MEM:
             mem_time = CONX_MEM[type]
         else:
             mem_time = CONX_MEM[DEFAULT]
         if mem_time:
-            k = 1 - 1/(FRAMERATE*float(mem_time))
+            # compensate for the frames skipped since the last evaluation
+            k = (1 - 1/(FRAMERATE*float(mem_time))) ** steps
             if index in self.m_avg_table:
                 old_avg = self.m_avg_table[index]
             else:
@@ -382,10 +523,20 @@ class Conductor(object):
 
         if dbug.LEV & dbug.MORE: 
             print "Conduct:update_all_cells"
+        self.m_cell_tick += 1
+        self.forget_gone_cells()
         for uid,cell in self.m_field.m_cell_dict.iteritems():
             if self.m_field.is_cell_good_to_go(uid):
                 for type, cell_test in self.cell_tests.iteritems():
-                    running_avg = cell_test(uid, type) * self.m_cellglobal
+                    index = str(uid)+'-'+str(type)
+                    period = self.eval_period(type, CELL_PERIOD, CELL_MEM)
+                    steps = self.eval_steps(index, period, self.m_cell_tick,
+                                            (uid,))
+                    # if this test is due, run it, otherwise reuse last result
+                    if steps:
+                        self.m_score_table[index] = cell_test(uid, type, steps)
+                    running_avg = self.m_score_table[index] * \
+                            self.m_cellglobal
                     if type in CELL_AVG:
                         avg_trigger = CELL_AVG[type]
                     else:
@@ -433,9 +584,12 @@ class Conductor(object):
                                 if dbug.LEV & dbug.COND: 
                                     print "Conduct:update_cell:delete happening:",uid,type
 
-    def record_cell_avg(self, id, type, sample):
+    def record_cell_avg(self, id, type, sample, steps=1):
         """Track Exponentially decaying weighted moving averages (ema) in an 
-        indexed dict."""
+        indexed dict.
+
+        steps is the number of frames this sample stands for, when the test
+        isn't evaluated every frame."""
         index = str(id)+'-'+str(type)
         if type in CELL_MEM:
             time = CELL_MEM[type]
@@ -448,7 +602,8 @@ class Conductor(object):
         if float(time)*FRAMERATE<=1:
             self.m_avg_table[index] = sample
         else:
-            k = 1 - 1/(FRAMERATE*float(time))
+            # compensate for the frames skipped since the last evaluation
+            k = (1 - 1/(FRAMERATE*float(time))) ** steps
             self.m_avg_table[index] = k*old_avg + (1-k)*sample
         return self.m_avg_table[index]
 
@@ -548,7 +703,7 @@ class Conductor(object):
     # Connections Tests
     #
 
-    def test_conx_grouped(self, cid, type, cell0, cell1):
+    def test_conx_grouped(self, cid, type, cell0, cell1, steps=1):
         """Are cells currently grouped?
         
         **Implemented & Successfully Tested
@@ -567,9 +722,9 @@ class Conductor(object):
         else:
             score = 0.0
         # we record our score in our running avg table
-        return self.record_conx_avg(cid, type, score)
+        return self.record_conx_avg(cid, type, score, steps)
 
-    def test_conx_friends(self, cid, type, cell0, cell1):
+    def test_conx_friends(self, cid, type, cell0, cell1, steps=1):
         """Are cells in proximity for some time? Pref facing each other?
 
         **Implemented & Successfully Tested
@@ -593,9 +748,9 @@ class Conductor(object):
             max_dist = CONX_QUAL[DEFAULT_MAX]
         score = max(0, 1 - float(dist) / max_dist)
         # we record our score in our running avg table
-        return self.record_conx_avg(cid, type, score)
+        return self.record_conx_avg(cid, type, score, steps)
 
-    def test_conx_contact(self, cid, type, cell0, cell1):
+    def test_conx_contact(self, cid, type, cell0, cell1, steps=1):
         """Are cells in contact with each other?
 
         **Implemented & Successfully Tested
@@ -616,9 +771,9 @@ class Conductor(object):
         else:
             score = 0
         # we record our score in our running avg table
-        return self.record_conx_avg(cid, type, score)
+        return self.record_conx_avg(cid, type, score, steps)
 
-    def test_conx_coord(self, cid, type, cell0, cell1):
+    def test_conx_coord(self, cid, type, cell0, cell1, steps=1):
         """Are individuals moving in a coordinated way.
 
         **Implemented & Not Tested
@@ -646,14 +801,14 @@ class Conductor(object):
             score = 0.01
         else:
             score=min(1,max(0,(cell0.m_vx*cell1.m_vx+cell0.m_vy*cell1.m_vy)/(spd0*spd1)))   #BST-use correlation between velocities instead
-        avgscore=self.record_conx_avg(cid, type, score)
+        avgscore=self.record_conx_avg(cid, type, score, steps)
         if dbug.LEV & dbug.COND & dbug.MORE: 
             print "coord: spd0=%.2f (%.2f,%.2f), spd1=%.2f (%.2f,%.2f), score=%.3f, avg=%.3f"%(spd0,cell0.m_vx,cell0.m_vy,spd1,cell1.m_vx,cell1.m_vy,score,avgscore)
 
         # we record our score in our running avg table
         return avgscore
 
-    def test_conx_fof(self, cid, type, cell0, cell1):
+    def test_conx_fof(self, cid, type, cell0, cell1, steps=1):
         """Are these cells connected through a third person?
         
         **Not Yes Implemented
@@ -665,7 +820,7 @@ class Conductor(object):
         """
         return 0
 
-    def test_conx_irlbuds(self, cid, type, cell0, cell1):
+    def test_conx_irlbuds(self, cid, type, cell0, cell1, steps=1):
         """Did these people come in together? Have they spent most of their
         time together?
 
@@ -694,9 +849,9 @@ class Conductor(object):
             score=0.0;
 
         # we record our score in our running avg table to make it into a fraction of time that these 2 people were within max_dist of each other
-        return self.record_conx_avg(cid, type, score)
+        return self.record_conx_avg(cid, type, score, steps)
 
-    def test_conx_leastconx(self, cid, type, cell0, cell1):
+    def test_conx_leastconx(self, cid, type, cell0, cell1, steps=1):
         """Are these individuals among the least connected in the field?
 
         **Not Yes Implemented
@@ -708,7 +863,7 @@ class Conductor(object):
         """
         return 0
 
-    def test_conx_mirror(self, cid, type, cell0, cell1):
+    def test_conx_mirror(self, cid, type, cell0, cell1, steps=1):
         """Are individuals moving in a mirrorwise way?
 
         **Not Yes Implemented
@@ -720,7 +875,7 @@ class Conductor(object):
         """
         return 0
 
-    def test_conx_nearby(self, cid, type, cell0, cell1):
+    def test_conx_nearby(self, cid, type, cell0, cell1, steps=1):
         """Are cells near each other but not otherwise connected?
 
         **Implemented & Not Tested
@@ -755,7 +910,7 @@ class Conductor(object):
         # nearby_max = 0; nearby_min = 1.0
         return 1.0 - ((cell_dist-min_dist) / (max_dist-min_dist))
 
-    def test_conx_strangers(self, cid, type, cell0, cell1):
+    def test_conx_strangers(self, cid, type, cell0, cell1, steps=1):
         """Are these cells unconnected? Have they never been connected?
 
         **Implemented & Not Tested
@@ -785,9 +940,9 @@ class Conductor(object):
             else:
                 score = 1.0
         # we record our score in our running avg table
-        return self.record_conx_avg(cid, type, score)
+        return self.record_conx_avg(cid, type, score, steps)
 
-    def test_conx_chosen(self, cid, type, cell0, cell1):
+    def test_conx_chosen(self, cid, type, cell0, cell1, steps=1):
         """Did the conductor choose these people to be connected?
 
         **Not Yes Implemented
@@ -799,7 +954,7 @@ class Conductor(object):
         """
         return 0
 
-    def test_conx_facing(self, cid, type, cell0, cell1):
+    def test_conx_facing(self, cid, type, cell0, cell1, steps=1):
         """Are cells facing each other over some time?
 
         **Implemented & Successfully Tested
@@ -864,7 +1019,7 @@ class Conductor(object):
             else:
                 score1=0.0
             score = score0 * score1
-            self.record_conx_avg(cid, type, score)
+            self.record_conx_avg(cid, type, score, steps)
             if dbug.LEV & dbug.COND & dbug.MORE: 
                 if score0 * score1:
                     print "facing:Frame:",self.m_field.m_frame,", CID:", cid, "HOLY SHIT, NOT ZERO"
@@ -882,7 +1037,7 @@ class Conductor(object):
     # Happenings
     #
 
-    def test_conx_fusion(self, cid, type, cell0, cell1):
+    def test_conx_fusion(self, cid, type, cell0, cell1, steps=1):
         """Are cells currently fusing/fisioning?
 
         **Implemented & Successfully Tested
@@ -915,7 +1070,7 @@ class Conductor(object):
         return 1.0 - ((cell_dist-min_dist) /
                       (max_dist-min_dist))
 
-    def test_conx_transfer(self, cid, type, cell0, cell1):
+    def test_conx_transfer(self, cid, type, cell0, cell1, steps=1):
         """Is a transfer of highlight happening between these cells?
 
         **Not Yes Implemented
@@ -931,7 +1086,7 @@ class Conductor(object):
     # Event Tests
     #
 
-    def test_conx_touch(self, cid, type, cell0, cell1):
+    def test_conx_touch(self, cid, type, cell0, cell1, steps=1):
         """Are these two people touching?
 
         **Not Implemented
@@ -950,9 +1105,9 @@ class Conductor(object):
         else:
             return 0.0
         # we (don't) record our score in our running avg table
-        #return self.record_conx_avg(cid, type, score)
+        #return self.record_conx_avg(cid, type, score, steps)
 
-    def test_conx_tag(self, cid, type, cell0, cell1):
+    def test_conx_tag(self, cid, type, cell0, cell1, steps=1):
         """Did one of these individuals tag the other?
 
         **Not Yes Implemented
@@ -969,7 +1124,7 @@ class Conductor(object):
     # Cell Tests
     #
 
-    def test_cell_dance(self, uid, type):
+    def test_cell_dance(self, uid, type, steps=1):
         """Does this cell have a history of behavior that looks like dancing?
 
         **Not Yes Implemented
@@ -982,10 +1137,10 @@ class Conductor(object):
         # we calculate a score
         # evaluate something here
         # we record our score in our running avg table
-        #return self.record_cell_avg(uid, type, score)
+        #return self.record_cell_avg(uid, type, score, steps)
         return 0
 
-    def test_cell_interactive(self, uid, type):
+    def test_cell_interactive(self, uid, type, steps=1):
         """Does this cell have a history of being interactive?
 
         **Implemented & Not Tested
@@ -1007,9 +1162,9 @@ class Conductor(object):
         else:
             score = max(0, 1 - float(cell.m_fromnearest) / max_dist)
         # we record our score in our running avg table
-        return self.record_cell_avg(uid, type, score)
+        return self.record_cell_avg(uid, type, score, steps)
 
-    def test_cell_static(self, uid, type):
+    def test_cell_static(self, uid, type, steps=1):
         """Does this cell have a history of being immobile?
 
         **Implemented & Successfully Tested
@@ -1030,13 +1185,13 @@ class Conductor(object):
             score=1.0
         else:
             score=0.0;
-    	avg=self.record_cell_avg(uid, type, score)
+    	avg=self.record_cell_avg(uid, type, score, steps)
         if dbug.LEV & dbug.COND & dbug.MORE: 
             print "test_cell_static: uid=%s, spd=%.2f, max_vel=%.2f, score=%.2f,avg=%.2f"%(uid,spd,max_vel,score,avg)
         # we record our score in our running avg table
         return avg
 
-    def test_cell_kinetic(self, uid, type):
+    def test_cell_kinetic(self, uid, type, steps=1):
         """Does this cell have a long history of going fast?
 
         **Implemented & Successfully Tested
@@ -1057,13 +1212,13 @@ class Conductor(object):
             score=1.0
         else:
             score=0.0
-        avg=self.record_cell_avg(uid, type, score)
+        avg=self.record_cell_avg(uid, type, score, steps)
         if dbug.LEV & dbug.COND & dbug.MORE: 
             print "test_cell_kinetic: uid=%s, spd=%.2f, min_vel=%.2f, score=%.2f, avg=%.2f"%(uid,spd,min_vel,score,avg)
         # we record our score in our running avg table
         return avg
 
-    def test_cell_fast(self, uid, type):
+    def test_cell_fast(self, uid, type, steps=1):
         """Does this cell have a short history of moving fast?
 
         **Implemented & Successfully Tested
@@ -1085,9 +1240,9 @@ class Conductor(object):
         else:
             score=0.0
         # we record our score in our running avg table
-        return self.record_cell_avg(uid, type, score)
+        return self.record_cell_avg(uid, type, score, steps)
 
-    def test_cell_timein(self, uid, type):
+    def test_cell_timein(self, uid, type, steps=1):
         """Does this cell have a history in the space?
 
         **Implemented & Not Tested
@@ -1109,9 +1264,9 @@ class Conductor(object):
         else:
             score = max(0, min(1, (float(age) / min_age)-1))
         # we record our score in our running avg table
-        return self.record_cell_avg(uid, type, score)
+        return self.record_cell_avg(uid, type, score, steps)
 
-    def test_cell_spin(self, uid, type):
+    def test_cell_spin(self, uid, type, steps=1):
         """Does this cell have a history of xxx?
 
         **Not Yes Implemented
@@ -1124,10 +1279,10 @@ class Conductor(object):
         # we calculate a score
         # evaluate something here
         # we record our score in our running avg table
-        #return self.record_cell_avg(uid, type, score)
+        #return self.record_cell_avg(uid, type, score, steps)
         return 0
 
-    def test_cell_quantum(self, uid, type):
+    def test_cell_quantum(self, uid, type, steps=1):
         """Does this cell have a history of xxx?
 
         **Not Yes Implemented
@@ -1140,10 +1295,10 @@ class Conductor(object):
         # we calculate a score
         # evaluate something here
         # we record our score in our running avg table
-        #return self.record_cell_avg(uid, type, score)
+        #return self.record_cell_avg(uid, type, score, steps)
         return 0
 
-    def test_cell_jacks(self, uid, type):
+    def test_cell_jacks(self, uid, type, steps=1):
         """Does this cell have a history of xxx?
 
         **Not Yes Implemented
@@ -1156,10 +1311,10 @@ class Conductor(object):
         # we calculate a score
         # evaluate something here
         # we record our score in our running avg table
-        #return self.record_cell_avg(uid, type, score)
+        #return self.record_cell_avg(uid, type, score, steps)
         return 0
 
-    def test_cell_chosen(self, uid, type):
+    def test_cell_chosen(self, uid, type, steps=1):
         """Does this cell have a history of xxx?
 
         **Not Yes Implemented
@@ -1172,5 +1327,5 @@ class Conductor(object):
         # we calculate a score
         # evaluate something here
         # we record our score in our running avg table
-        #return self.record_cell_avg(uid, type, score)
+        #return self.record_cell_avg(uid, type, score, steps)
         return 0
@@ -122,6 +122,8 @@ def main():
         keep_running = osc.m_run & field.m_still_running
 
     osc.m_oscserver.close()
+    if conductor.m_pool is not None:
+        conductor.m_pool.close()
 
 if __name__ == '__main__':
     #try:
@@ -25,6 +25,7 @@ from time import time
 
 # local modules
 from shared.oschandler import OSCHandler
+from shared.statechannel import StateChannel
 from shared import config
 from shared import debug
 
@@ -50,6 +51,16 @@ else:
 OSCTIMEOUT = config.osctimeout
 OSCPATH = config.oscpath
 REPORT_FREQ = config.report_frequency
+REPORT_DELTA = config.report_delta
+REPORT_EPSILON = config.report_epsilon
+REPORT_KEEPALIVE = config.report_keepalive
+STATE_CHANNEL = config.state_channel
+# what the visual gets from the state channel rather than by OSC
+STATE_CHANNEL_PATHS = [
+    OSCPATH['conduct_rollcall'],
+    OSCPATH['conduct_attr'],
+    OSCPATH['conduct_conx'],
+]
 PERSIST = 'persistent'
 HAPPEN = 'happening'
 
@@ -105,6 +116,14 @@ class MyOSCHandler(OSCHandler):
 
     def __init__(self, field=None, conductor=None):
         self.m_conductor = conductor
+        # last (value, time) reported for each attr, for delta reporting
+        self.m_sent_attrs = {}
+        self.m_sent_conxs = {}
+        # same-host shared-memory state channel for the visual
+        self.m_state_channel = None
+        self.m_state_published = False
+        if STATE_CHANNEL:
+            self.m_state_channel = StateChannel(writer=True)
         osc_server = []
         osc_clients = []
 
@@ -133,7 +152,8 @@ class MyOSCHandler(OSCHandler):
 
         self.eventfunc_enum = {}
         for type in CELL_ATTR_TYPES + CONX_ATTR_TYPES:
-            for param in ("trigger", "memory", "maxage","qual","qualmin","qualmax"):
+            for param in ("trigger", "memory", "maxage","qual","qualmin","qualmax",
+                          "period"):
                 self.eventfunc_enum.update({
                     OSCPATH['ui_condparam']+type+'/'+param: self.event_ui_condparam
                 })
@@ -157,9 +177,8 @@ class MyOSCHandler(OSCHandler):
             target_ip = client.address()[0]
             if target_ip == source_ip:
                 try:
-                    #TODO: Decide what we dump and dump it
-                    #self.sendto(clientkey, OSCPATH('ping'), ping_code)
                     print "OSC:dump_req:from", clientkey
+                    self.send_dump(clientkey)
                 except:
                     if dbug.LEV & dbug.MSGS:
                         print "OSC:dump_req:unable to reach", clientkey
@@ -238,6 +257,8 @@ class MyOSCHandler(OSCHandler):
     def send_regular_reports(self):
         """Send all the reports that are send every cycle."""
         frame = self.m_field.m_frame
+        if self.m_state_channel is not None:
+            self.publish_state()
         if frame%REPORT_FREQ['rollcall'] == 0:
             self.send_rollcall()
         if frame%REPORT_FREQ['attrs'] == 0:
@@ -320,24 +341,63 @@ class MyOSCHandler(OSCHandler):
         
         /conductor/attr ["type",uid,value,time]
         """
+        now = time()
+        seen = {}
         for uid, cell in self.m_field.m_cell_dict.iteritems():
             if cell.m_visible:
                 for type, attr in cell.m_attr_dict.iteritems():
-                    duration = time() - attr.m_createtime
+                    key = (uid, type)
+                    seen[key] = True
+                    if not self.is_report_due(self.m_sent_attrs, key,
+                                              attr.m_value, now):
+                        continue
+                    duration = now - attr.m_createtime
                     self.m_field.m_osc.send_downstream(OSCPATH['conduct_attr'],
                             [type, uid, attr.m_value, duration])
+        self.forget_unseen(self.m_sent_attrs, seen)
 
     def send_conx_attr(self):
         """Sends the current descriptions of connectors.
         
         /conductor/conx [cid,"type",uid0,uid1,value,time]
         """
+        now = time()
+        seen = {}
         for cid,conx in self.m_field.m_conx_dict.iteritems():
             if conx.m_cell0.m_visible and conx.m_cell1.m_visible:
                 for type, attr in conx.m_attr_dict.iteritems():
-                    duration = time() - attr.m_createtime
+                    key = (cid, type)
+                    seen[key] = True
+                    if not self.is_report_due(self.m_sent_conxs, key,
+                                              attr.m_value, now):
+                        continue
+                    duration = now - attr.m_createtime
                     self.send_conx_downstream(cid, type, conx.m_cell0.m_id,
                             conx.m_cell1.m_id, attr.m_value, duration)
+        self.forget_unseen(self.m_sent_conxs, seen)
+
+    def is_report_due(self, sent_table, key, value, now):
+        """Should this attr be reported in this cycle?
+
+        With delta reporting, an attr is only resent if its value has changed
+        by more than REPORT_EPSILON since we last sent it, or if it hasn't been
+        sent for REPORT_KEEPALIVE seconds. If it is due, we note what we sent.
+        """
+        if not REPORT_DELTA:
+            return True
+        if key in sent_table:
+            (last_value, last_time) = sent_table[key]
+            if abs(value - last_value) <= REPORT_EPSILON and \
+                    now - last_time < REPORT_KEEPALIVE:
+                return False
+        sent_table[key] = (value, now)
+        return True
+
+    def forget_unseen(self, sent_table, seen):
+        """Forget attrs that are gone (or hidden) so they are sent afresh."""
+        for key in sent_table.keys():
+            if key not in seen:
+                del sent_table[key]
 
     def send_group_attrs(self):
         """Sends the current attributes of visible groups.
@@ -361,20 +421,105 @@ class MyOSCHandler(OSCHandler):
             self.m_field.m_osc.send_downstream(OSCPATH['conduct_event'],
                     [event.m_type, event.m_uid0, event.m_uid1, event.m_value, duration])
 
+    def publish_state(self):
+        """Publishes our state to the shared-memory state channel.
+
+        Holds the same cells, cell attrs and connector attrs as the rollcall,
+        attr and conx reports, but in full and every frame. Event types go
+        out as /conductor/event, which the visual doesn't draw, so they're
+        left out.
+        """
+        cells = []
+        attrs = []
+        conxs = []
+        for uid, cell in self.m_field.m_cell_dict.iteritems():
+            cells.append((uid, cell.m_visible))
+            if cell.m_visible:
+                for type, attr in cell.m_attr_dict.iteritems():
+                    attrs.append((uid, type, attr.m_value))
+        for cid, conx in self.m_field.m_conx_dict.iteritems():
+            if conx.m_cell0.m_visible and conx.m_cell1.m_visible:
+                for type, attr in conx.m_attr_dict.iteritems():
+                    if type in EVENT_TYPES:
+                        continue
+                    conxs.append((conx.m_cell0.m_id, conx.m_cell1.m_id,
+                                  type, attr.m_value))
+        self.m_state_published = self.m_state_channel.publish(
+                self.m_field.m_frame, cells, attrs, conxs)
+
+    def send_downstream(self, path, args):
+        """Send OSC Message downstream.
+
+        If the visual is reading the state channel, it is left out of the
+        messages that the channel carries, unless this frame didn't fit.
+        """
+        if self.m_state_published and path in STATE_CHANNEL_PATHS:
+            self.send_to('sound', path, args)
+            self.send_to('recorder', path, args)
+            self.send_to('laser', path, args)
+        else:
+            super(MyOSCHandler, self).send_downstream(path, args)
+
     # On-Call Messages
 
-    def send_conx_downstream(self, cid, type, uid0, uid1, value, duration):
+    def send_dump(self, clientkey):
+        """Sends a full snapshot of our state to one client.
+
+        The snapshot is made of the usual rollcall, attr, conx and gattr
+        messages, packed into as few bundles as will fit in a datagram, so a
+        client that has just (re)started is current in one round trip. Unlike
+        the regular reports, this ignores delta reporting. Events are one-shot,
+        so they aren't sent again.
+        """
+        now = time()
+        msgs = []
+        for uid, cell in self.m_field.m_cell_dict.iteritems():
+            if cell.m_visible:
+                action = "visible"
+            else:
+                action = "hidden"
+            msgs.append((OSCPATH['conduct_rollcall'],
+                    [uid, action, len(cell.m_conx_dict)]))
+        for uid, cell in self.m_field.m_cell_dict.iteritems():
+            if cell.m_visible:
+                for type, attr in cell.m_attr_dict.iteritems():
+                    msgs.append((OSCPATH['conduct_attr'],
+                            [type, uid, attr.m_value, now - attr.m_createtime]))
+        for cid, conx in self.m_field.m_conx_dict.iteritems():
+            if conx.m_cell0.m_visible and conx.m_cell1.m_visible:
+                for type, attr in conx.m_attr_dict.iteritems():
+                    if type in EVENT_TYPES:
+                        continue
+                    msgs.append(self.conx_msg(cid, type, conx.m_cell0.m_id,
+                            conx.m_cell1.m_id, attr.m_value,
+                            now - attr.m_createtime))
+        for gid, group in self.m_field.m_group_dict.iteritems():
+            if group.m_visible:
+                for type, attr in group.m_attr_dict.iteritems():
+                    msgs.append((OSCPATH['conduct_gattr'],
+                            [type, gid, attr.m_value, now - attr.m_createtime]))
+        if dbug.LEV & dbug.MSGS:
+            print "OSC:send_dump:%d msgs to %s" % (len(msgs), clientkey)
+        self.send_bundles_to(clientkey, msgs)
+
+    def conx_msg(self, cid, type, uid0, uid1, value, duration):
+        """Returns the (path, args) that describe a connector attr."""
         if type in HAPPENING_TYPES:
-            print "send:",   [HAPPEN, type, cid, uid0, uid1, value, duration]
-            self.m_field.m_osc.send_downstream(OSCPATH['conduct_conx'],
+            return (OSCPATH['conduct_conx'],
                     [HAPPEN, type, cid, uid0, uid1, 1.0*value, duration])
         elif type in EVENT_TYPES:
-            self.m_field.m_osc.send_downstream(OSCPATH['conduct_event'],
+            return (OSCPATH['conduct_event'],
                     [type, cid, uid0, uid1, 1.0*value])
         else:
-            self.m_field.m_osc.send_downstream(OSCPATH['conduct_conx'],
+            return (OSCPATH['conduct_conx'],
                     [PERSIST, type, cid, uid0, uid1, 1.0*value, duration])
 
+    def send_conx_downstream(self, cid, type, uid0, uid1, value, duration):
+        if type in HAPPENING_TYPES:
+            print "send:",   [HAPPEN, type, cid, uid0, uid1, value, duration]
+        (path, args) = self.conx_msg(cid, type, uid0, uid1, value, duration)
+        self.m_field.m_osc.send_downstream(path, args)
+
     def nix_cell_attr(self, uid, type):
         """Sends OSC messages to announce the removal of cell attr.
         
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Parallel evaluation of connector tests.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "pairpool.py"
+__author__ = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+# installed modules
+
+# local modules
+from shared import config
+
+# local classes
+from shared import debug
+
+# constants
+LOGFILE = config.logfile
+
+MAX_CELLS = config.conductor_max_cells
+
+# columns of the shared cell snapshot
+COL_X = 0
+COL_Y = 1
+COL_VX = 2
+COL_VY = 3
+COL_GID = 4
+COL_FACING = 5
+COL_CREATETIME = 6
+NCOLS = 7
+
+# init debugging
+dbug = debug.Debug()
+
+# worker process globals, set up by _init_worker
+_snapshot = None
+_conductor = None
+
+
+class PairPool(object):
+    """A pool of worker processes that evaluate connector tests.
+
+    The cells are copied once per frame into a shared-memory snapshot that
+    the workers inherit when the pool is created. The pairs are partitioned
+    into shards, and each worker runs the conductor's own test methods over
+    its shard with a copy of the running averages for those pairs. The
+    scores and updated averages are merged back into the conductor before
+    trigger evaluation, so the results are the same as a single-process run.
+
+    Stores the following values:
+        m_workers: number of worker processes
+        m_snapshot: shared array of MAX_CELLS x NCOLS floats
+        m_pool: the multiprocessing pool
+
+    """
+
+    def __init__(self, workers):
+        self.m_workers = workers
+        self.m_snapshot = RawArray('d', MAX_CELLS*NCOLS)
+        self.m_pool = multiprocessing.Pool(workers, _init_worker,
+                                           (self.m_snapshot,))
+
+    def is_usable(self, ncells):
+        """Can the snapshot hold this many cells?"""
+        return ncells <= MAX_CELLS
+
+    def close(self):
+        self.m_pool.terminate()
+        self.m_pool.join()
+
+    def score_pairs(self, conductor, pairs):
+        """Evaluate the due tests of all pairs across the pool.
+
+        pairs is a list of (cid, cell0, cell1, due) where due is a list of
+        (type, steps) for the tests to be evaluated this frame.  The results
+        are stored in the conductor's score and avg tables.
+        """
+        field = conductor.m_field
+        # write the snapshot
+        uids = []
+        for row, cell in enumerate(field.m_cell_dict.values()):
+            uids.append(cell.m_id)
+            base = row*NCOLS
+            self.m_snapshot[base+COL_X] = _pack(cell.m_x)
+            self.m_snapshot[base+COL_Y] = _pack(cell.m_y)
+            self.m_snapshot[base+COL_VX] = _pack(cell.m_vx)
+            self.m_snapshot[base+COL_VY] = _pack(cell.m_vy)
+            self.m_snapshot[base+COL_GID] = _pack(cell.m_gid)
+            self.m_snapshot[base+COL_FACING] = _pack(cell.m_body.m_facing)
+            self.m_snapshot[base+COL_CREATETIME] = _pack(cell.m_createtime)
+        conxs = [(cid, conx.m_cell0.m_id, conx.m_cell1.m_id)
+                 for cid, conx in field.m_conx_dict.iteritems()
+                 if conx.m_cell0 is not None and conx.m_cell1 is not None]
+        # the UI may have changed the parameters since the workers forked
+        tables = (config.connector_qualifying_triggers,
+                  config.connector_memory_time)
+        # partition the pairs into shards
+        shards = [[] for i in range(self.m_workers)]
+        for i, (cid, cell0, cell1, due) in enumerate(pairs):
+            if due:
+                shards[i % self.m_workers].append(
+                    (cid, cell0.m_id, cell1.m_id, due))
+        tasks = []
+        for shard in shards:
+            if not shard:
+                continue
+            avgs = {}
+            for (cid, uid0, uid1, due) in shard:
+                for (type, steps) in due:
+                    index = str(cid)+'-'+str(type)
+                    if index in conductor.m_avg_table:
+                        avgs[index] = conductor.m_avg_table[index]
+            tasks.append((uids, conxs, field.m_frame, tables, shard, avgs))
+        if dbug.LEV & dbug.COND & dbug.MORE:
+            print "PairPool:score_pairs:pairs:", len(pairs), \
+                  "shards:", len(tasks)
+        # merge results back
+        for (scores, avgs) in self.m_pool.map(_score_shard, tasks):
+            conductor.m_score_table.update(scores)
+            conductor.m_avg_table.update(avgs)
+
+
+# Snapshot encoding: None is stored as NaN
+
+def _pack(value):
+    if value is None:
+        return float('nan')
+    return value
+
+def _unpack(value):
+    if value != value:
+        return None
+    return value
+
+
+# Worker side
+
+class _Body(object):
+    def __init__(self, facing):
+        self.m_facing = facing
+
+
+class _CellProxy(object):
+    """Read-only stand-in for a cell, built from the snapshot."""
+    def __init__(self, id, row):
+        base = row*NCOLS
+        self.m_id = id
+        self.m_x = _unpack(_snapshot[base+COL_X])
+        self.m_y = _unpack(_snapshot[base+COL_Y])
+        self.m_vx = _unpack(_snapshot[base+COL_VX])
+        self.m_vy = _unpack(_snapshot[base+COL_VY])
+        gid = _unpack(_snapshot[base+COL_GID])
+        if gid is not None:
+            gid = int(gid)
+        self.m_gid = gid
+        self.m_body = _Body(_unpack(_snapshot[base+COL_FACING]))
+        self.m_createtime = _snapshot[base+COL_CREATETIME]
+        self.m_conx_dict = {}
+
+
+class _ConxProxy(object):
+    def __init__(self, id, cell0, cell1):
+        self.m_id = id
+        self.m_cell0 = cell0
+        self.m_cell1 = cell1
+        cell0.m_conx_dict[id] = self
+        cell1.m_conx_dict[id] = self
+
+
+class _FieldProxy(object):
+    def __init__(self, cell_dict, conx_dict, frame):
+        self.m_cell_dict = cell_dict
+        self.m_conx_dict = conx_dict
+        self.m_frame = frame
+
+
+def _init_worker(snapshot):
+    global _snapshot, _conductor
+    # imported here since the conductor imports us
+    from conductor import Conductor
+    _snapshot = snapshot
+    _conductor = Conductor(workers=0)
+
+def _score_shard(task):
+    """Run the due tests on a shard of pairs; return scores and avgs."""
+    (uids, conxs, frame, tables, shard, avgs) = task
+    (qual, mem) = tables
+    config.connector_qualifying_triggers.update(qual)
+    config.connector_memory_time.update(mem)
+    cell_dict = {}
+    for row, uid in enumerate(uids):
+        cell_dict[uid] = _CellProxy(uid, row)
+    conx_dict = {}
+    for (cid, uid0, uid1) in conxs:
+        if uid0 in cell_dict and uid1 in cell_dict:
+            conx_dict[cid] = _ConxProxy(cid, cell_dict[uid0], cell_dict[uid1])
+    _conductor.update(field=_FieldProxy(cell_dict, conx_dict, frame))
+    _conductor.m_avg_table = avgs
+    scores = {}
+    for (cid, uid0, uid1, due) in shard:
+        cell0 = cell_dict[uid0]
+        cell1 = cell_dict[uid1]
+        _conductor.m_dist_table[cid] = _conductor.dist(cell0, cell1)
+        for (type, steps) in due:
+            scores[str(cid)+'-'+str(type)] = \
+                    _conductor.conx_tests[type](cid, type, cell0, cell1, steps)
+    return (scores, _conductor.m_avg_table)
+
+
+if __name__ == "__main__":
+
+    # Benchmark: score all pairs of a crowd with 1..ncpu workers
+
+    import random
+    from time import time
+    from myfield import MyField
+    from conductor import Conductor
+
+    NCELLS = 40
+    NFRAMES = 50
+
+    def make_field():
+        random.seed(0)
+        field = MyField()
+        for uid in range(1, NCELLS+1):
+            field.update_cell(uid, x=random.uniform(-8, 8),
+                              y=random.uniform(0, 16),
+                              vx=random.uniform(-1, 1),
+                              vy=random.uniform(-1, 1), gid=0)
+            field.update_body(uid, facing=random.uniform(0, 360))
+            # age the crowd so the time-dependent tests are settled
+            field.m_cell_dict[uid].m_createtime -= 3600
+        return field
+
+    def run(workers):
+        field = make_field()
+        conductor = Conductor(field=field, workers=workers)
+        start = time()
+        for frame in range(NFRAMES):
+            conductor.m_conx_tick += 1
+            pairs = conductor.find_pairs()
+            if workers:
+                conductor.m_pool.score_pairs(conductor, pairs)
+            else:
+                conductor.score_pairs(pairs)
+        elapsed = time() - start
+        if workers:
+            conductor.m_pool.close()
+        return (elapsed, conductor.m_avg_table)
+
+    (base, base_avgs) = run(0)
+    print "serial: %.3f sec/frame" % (base/NFRAMES)
+    for workers in range(1, multiprocessing.cpu_count()+1):
+        (elapsed, avgs) = run(workers)
+        print "%d workers: %.3f sec/frame, speedup %.2f, match: %s" % \
+                (workers, elapsed/NFRAMES, base/elapsed, avgs == base_avgs)
@@ -138,6 +138,20 @@ cell_latitude = {
     # all as percentage variance
 }
 
+# Multi-rate scheduling of tests
+#   Tests with a long memory_time don't need to be evaluated every frame. Each
+#   test is evaluated every n frames where n is taken from the eval_period
+#   tables below, or if absent, derived from the memory_time so that we take
+#   about evals_per_memory_time samples over the memory. Slow tests are
+#   spread across frames in round-robin slices.
+evals_per_memory_time = 100     # samples taken over a memory_time
+max_eval_period = 25    # never evaluate less often than this (frames)
+
+cell_eval_period = {
+    # in frames
+    # absent = derive from memory_time
+}
+
 
 connector_avg_min = 0.01    # below this and we consider it zero
 connector_avg_triggers = {
@@ -240,18 +254,66 @@ connector_latitude = {
     'heading': 10,
 }
 
+connector_eval_period = {
+    # in frames
+    # absent = derive from memory_time
+    # event values
+    'touch': 1,
+    'tag': 1,
+}
+
+# Parallel evaluation of connector tests
+#   0 = evaluate all pairs in the conductor process
+#   n = shard the pairs across a pool of n worker processes
+conductor_workers = 0
+conductor_max_cells = 64    # capacity of the shared cell snapshot
+
 
 # visual configuration
 #
-graphic_modes = 3   # 1=screen; 2=osc; 3=etherdream
-#graphic_modes = 1 | 2   # 1=screen; 2=osc; 3=etherdream
+graphic_modes = 3   # 1=screen; 2=osc; 4=etherdream
+#graphic_modes = 1 | 2   # 1=screen; 2=osc; 4=etherdream
 #draw_bodies = True
 draw_bodies = False
 
+# Laser output in osc mode
+#   False = send each color, cubic, begin and end to the laser as it's drawn
+#   True = pack the frame into a display list (see visual/displaylist.py) and
+#          send it, in as few /laser/displaylist messages as fit in a
+#          datagram, in place of /laser/update
+laser_display_list = False
+
+# Planning of the laser's frame (see visual/laserplan.py)
+#   False = send the cells and connectors in the order they're drawn
+#   True = hold the frame until /laser/update, then send it ordered to keep
+#          the blanked jumps short, and simplified or thinned out to fit in
+#          laser_pps points a second
+laser_plan = False
+laser_pps = 30000           # points per second the laser can draw
+laser_point_spacing = 0.01  # m between points, as the laser engine is set
+laser_blank_points = 8      # points to blank from one shape to the next
+laser_min_points = 16       # fewest points to draw any one shape
+
+# Where etherdream mode streams its points (see visual/pointstream.py)
+#   'ilda:<filename>' = write the frames to an ILDA file
+#   'udp:<host>:<port>' = send them as datagrams, standing in for a DAC
+laser_stream_sink = 'udp:127.0.0.1:7790'
+
 # Line mode, one of 
 #   'direct', 'curve', 'simple', 'improved-simple', 'pathfinding', 'improved_pathfinding'
 linemode = 'curves'
 
+# Path planner for the pathfinding line modes, one of
+#   'astar' - plan each connector from scratch each frame
+#   'hierarchical' - plan long connectors on a coarse grid first
+#   'dstarlite' - keep each connector's search and repair it as things move
+path_planner = 'astar'
+
+# Parallel planning of connector paths ('astar' and 'hierarchical' only)
+#   0 = plan the paths one after another in the visual process
+#   n = plan them all at once across a pool of n worker processes
+path_workers = 0
+
 inverse=True
 if inverse:
     default_bkgdcolor = (0, 0, 0, 1)    # black
@@ -265,7 +327,14 @@ else:
     default_linecolor = (0,0,0)     # black
     default_bodycolor = (.1,.1,.1)  # gray
 
-curve_segments = 12     # number of line segs in a curve
+curve_segments = 12     # most points in a curve
+# curves get as many points as they need to stay this close to the real curve,
+# up to curve_segments; 0 to always use curve_segments
+curve_tolerance = 0.5       # pixels, on the screen
+laser_curve_tolerance = 32  # DAC units, in etherdream mode
+# shapes on the screen are only redrawn when they move or change size by more
+# than this (m)
+redraw_tolerance = 0.005
 fuzzy_area_for_cells = 1
 
 #minimum_connection_distance = 12000   # this is cm sq
@@ -313,7 +382,26 @@ report_frequency = {
     'events': 1,
     'uisettings':50,
 }
+
+# Delta reporting: only resend cell and connector attrs whose value has
+# changed by more than report_epsilon, or that haven't been sent for
+# report_keepalive seconds. A /conductor/dump always gets everything.
+report_delta = False
+report_epsilon = 0.02
+report_keepalive = 1.0  # sec
+
 osctimeout = 0
+osc_max_datagram = 1400 # bytes; bundles are kept under a typical MTU
+
+# Same-host state channel
+#   The conductor can publish its state each frame into a ring buffer in a
+#   memory-mapped file, which the visual subsystem reads directly when it
+#   runs on the same host. The visual then gets no rollcall, attr or conx
+#   messages over OSC. Remote peers (like sound) still get OSC.
+state_channel = False
+state_channel_file = "/dev/shm/crs-state"
+state_channel_slots = 4
+state_channel_slot_size = 262144  # bytes
 
 oscpath = {
     # Common
@@ -372,6 +460,7 @@ oscpath = {
     'graph_end_conx':"/laser/conx/end",
     'graph_begin_cell':"/laser/cell/begin",
     'graph_end_cell':"/laser/cell/end",
+    'graph_display_list':"/laser/displaylist",
     
     # Conductor subsystem
     #
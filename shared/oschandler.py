@@ -21,7 +21,7 @@ __license__ = "GNU GPL 3.0 or later"
 import types
 
 # installed modules
-from OSC import OSCServer, OSCClient, OSCMessage
+from OSC import OSCServer, OSCClient, OSCMessage, OSCBundle
 #import pyglet
 
 # local modules
@@ -33,6 +33,7 @@ from shared import debug
 # Constants
 
 OSCTIMEOUT = config.osctimeout
+MAX_DATAGRAM = config.osc_max_datagram
 OSCPATH = config.oscpath
 REPORT_FREQ = config.report_frequency
 
@@ -184,6 +185,58 @@ class OSCHandler(object):
             return False
         return True
 
+    def send_bundles_to(self, clientkey, msglist):
+        """Send a list of (path, args) to one client as OSC bundles.
+
+        The messages are packed in order into as few bundles as will fit in
+        MAX_DATAGRAM bytes. A message too big to share a bundle goes alone.
+        """
+        # a bundle is "#bundle", a timetag, then a size-prefixed element
+        # for each message
+        empty_size = len(OSCBundle().getBinary())
+        bundle = OSCBundle()
+        size = empty_size
+        for (path, args) in msglist:
+            binary_size = len(OSCMessage(path, args).getBinary()) + 4
+            if size > empty_size and size + binary_size > MAX_DATAGRAM:
+                if not self.send_bundle_to(clientkey, bundle):
+                    return False
+                bundle = OSCBundle()
+                size = empty_size
+            bundle.append(OSCMessage(path, args))
+            size += binary_size
+        if size > empty_size:
+            return self.send_bundle_to(clientkey, bundle)
+        return True
+
+    def send_bundle_to(self, clientkey, bundle):
+        """Send an OSC bundle to one client."""
+        try:
+            self.m_osc_clients[clientkey].send(bundle)
+            if dbug.LEV & dbug.MSGS:
+                print "OSC:Send bundle to %s: %d bytes" % \
+                        (clientkey, len(bundle.getBinary()))
+        except:
+            if dbug.LEV & dbug.MSGS:
+                print "OSC:Send:Unable to reach host",clientkey
+            return False
+        return True
+
+    def send_blob_to(self, clientkey, path, args, blob):
+        """Send OSC Message with args and then a blob to one client."""
+        msg = OSCMessage(path, args)
+        msg.append(blob, 'b')
+        try:
+            self.m_osc_clients[clientkey].send(msg)
+            if dbug.LEV & dbug.MSGS:
+                print "OSC:Send to %s: %s %s + %d byte blob" % \
+                        (clientkey, path, args, len(blob))
+        except:
+            if dbug.LEV & dbug.MSGS:
+                print "OSC:Send:Unable to reach host",clientkey
+            return False
+        return True
+
     def send_laser(self, path, args):
         """Send OSC Message to one client."""
         self.send_to('laser', path, args)
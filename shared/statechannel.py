@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Shared-memory state channel between subsystems on the same host.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "statechannel.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+import os
+import mmap
+import struct
+
+# installed modules
+
+# local modules
+from shared import config
+
+# local classes
+from shared import debug
+
+# constants
+LOGFILE = config.logfile
+
+CHANNEL_FILE = config.state_channel_file
+CHANNEL_SLOTS = config.state_channel_slots
+CHANNEL_SLOT_SIZE = config.state_channel_slot_size
+
+MAGIC = 'CRS1'
+# magic, nslots, slot_size, latest version
+HEADER = struct.Struct('<4sIIQ')
+HEADER_SIZE = 32
+# version, payload size
+SLOT_HEADER = struct.Struct('<QI')
+SLOT_HEADER_SIZE = 16
+# frame, ncells, nattrs, nconxs
+COUNTS = struct.Struct('<IIII')
+# uid, visible
+CELL_REC = struct.Struct('<iB')
+# uid, type, value
+ATTR_REC = struct.Struct('<i16sf')
+# uid0, uid1, type, value
+CONX_REC = struct.Struct('<ii16sf')
+
+# init debugging
+dbug = debug.Debug()
+
+
+class StateChannel(object):
+    """A ring of versioned snapshots in a memory-mapped file.
+
+    The writer (the conductor) publishes a snapshot of cells, cell attrs and
+    connector attrs each frame into the next slot of the ring, then bumps the
+    latest version in the header. A reader (the visual subsystem) unpacks the
+    latest slot straight out of the map, and checks the slot's version again
+    afterward to be sure the writer didn't lap it while it was reading.
+
+    Stores the following values:
+        m_writer: are we the publishing end? (boolean)
+        m_filename: path of the mapped file
+        m_map: the mmap, or None if not (yet) open
+        m_nslots: number of slots in the ring
+        m_slot_size: size of each slot, including its header
+        m_version: last version we wrote or read
+
+    """
+
+    def __init__(self, writer=False, filename=CHANNEL_FILE):
+        self.m_writer = writer
+        self.m_filename = filename
+        self.m_map = None
+        self.m_nslots = CHANNEL_SLOTS
+        self.m_slot_size = CHANNEL_SLOT_SIZE
+        self.m_version = 0
+        self.open()
+
+    def open(self):
+        """Map the file, creating it if we are the writer."""
+        if self.m_writer:
+            size = HEADER_SIZE + self.m_nslots*self.m_slot_size
+            fd = os.open(self.m_filename, os.O_RDWR | os.O_CREAT, 0644)
+            try:
+                if os.fstat(fd).st_size != size:
+                    os.ftruncate(fd, size)
+                self.m_map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+            (magic, nslots, slot_size, latest) = \
+                    HEADER.unpack_from(self.m_map, 0)
+            # keep counting from a previous run so readers see it as new
+            if magic == MAGIC:
+                self.m_version = latest
+            HEADER.pack_into(self.m_map, 0, MAGIC, self.m_nslots,
+                             self.m_slot_size, self.m_version)
+        else:
+            try:
+                fd = os.open(self.m_filename, os.O_RDONLY)
+            except OSError:
+                # the writer hasn't started yet, we'll try again later
+                return False
+            try:
+                size = os.fstat(fd).st_size
+                if size < HEADER_SIZE:
+                    return False
+                self.m_map = mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+            finally:
+                os.close(fd)
+            (magic, self.m_nslots, self.m_slot_size, latest) = \
+                    HEADER.unpack_from(self.m_map, 0)
+            if magic != MAGIC or \
+                    size < HEADER_SIZE + self.m_nslots*self.m_slot_size:
+                self.close()
+                return False
+        if dbug.LEV & dbug.MSGS:
+            print "StateChannel:open:", self.m_filename, \
+                  "writer:", self.m_writer
+        return True
+
+    def close(self):
+        if self.m_map is not None:
+            self.m_map.close()
+            self.m_map = None
+
+    def slot_offset(self, version):
+        return HEADER_SIZE + (version % self.m_nslots)*self.m_slot_size
+
+    def publish(self, frame, cells, attrs, conxs):
+        """Write a snapshot to the next slot.
+
+        args:
+            frame - frame number
+            cells - list of (uid, visible)
+            attrs - list of (uid, type, value)
+            conxs - list of (uid0, uid1, type, value)
+        returns:
+            True if published, False if the snapshot didn't fit in a slot
+        """
+        size = COUNTS.size + len(cells)*CELL_REC.size + \
+               len(attrs)*ATTR_REC.size + len(conxs)*CONX_REC.size
+        if SLOT_HEADER_SIZE + size > self.m_slot_size:
+            if dbug.LEV & dbug.MSGS:
+                print "StateChannel:publish:snapshot of", size, \
+                      "bytes is too big for slot"
+            return False
+        version = self.m_version + 1
+        base = self.slot_offset(version)
+        # mark the slot as being written
+        SLOT_HEADER.pack_into(self.m_map, base, 0, 0)
+        offset = base + SLOT_HEADER_SIZE
+        COUNTS.pack_into(self.m_map, offset, frame, len(cells), len(attrs),
+                         len(conxs))
+        offset += COUNTS.size
+        for (uid, visible) in cells:
+            CELL_REC.pack_into(self.m_map, offset, uid, visible)
+            offset += CELL_REC.size
+        for (uid, type, value) in attrs:
+            ATTR_REC.pack_into(self.m_map, offset, uid, type, value)
+            offset += ATTR_REC.size
+        for (uid0, uid1, type, value) in conxs:
+            CONX_REC.pack_into(self.m_map, offset, uid0, uid1, type, value)
+            offset += CONX_REC.size
+        SLOT_HEADER.pack_into(self.m_map, base, version, size)
+        HEADER.pack_into(self.m_map, 0, MAGIC, self.m_nslots,
+                         self.m_slot_size, version)
+        self.m_version = version
+        return True
+
+    def read(self):
+        """Read the latest snapshot, if there is one we haven't seen.
+
+        returns:
+            (frame, cells, attrs, conxs) as given to publish, or None
+        """
+        if self.m_map is None and not self.open():
+            return None
+        latest = HEADER.unpack_from(self.m_map, 0)[3]
+        if latest == self.m_version:
+            return None
+        base = self.slot_offset(latest)
+        (version, size) = SLOT_HEADER.unpack_from(self.m_map, base)
+        if version != latest or size > self.m_slot_size - SLOT_HEADER_SIZE:
+            return None
+        # a torn read can give us any counts at all, so they have to agree
+        # with the size before we trust them
+        try:
+            offset = base + SLOT_HEADER_SIZE
+            (frame, ncells, nattrs, nconxs) = \
+                    COUNTS.unpack_from(self.m_map, offset)
+            if COUNTS.size + ncells*CELL_REC.size + nattrs*ATTR_REC.size + \
+                    nconxs*CONX_REC.size != size:
+                return None
+            offset += COUNTS.size
+            cells = []
+            for i in xrange(ncells):
+                cells.append(CELL_REC.unpack_from(self.m_map, offset))
+                offset += CELL_REC.size
+            attrs = []
+            for i in xrange(nattrs):
+                (uid, type, value) = ATTR_REC.unpack_from(self.m_map, offset)
+                attrs.append((uid, type.rstrip('\0'), value))
+                offset += ATTR_REC.size
+            conxs = []
+            for i in xrange(nconxs):
+                (uid0, uid1, type, value) = \
+                        CONX_REC.unpack_from(self.m_map, offset)
+                conxs.append((uid0, uid1, type.rstrip('\0'), value))
+                offset += CONX_REC.size
+        except struct.error:
+            return None
+        # if the writer came round to this slot while we read it, drop it
+        if SLOT_HEADER.unpack_from(self.m_map, base)[0] != latest:
+            return None
+        self.m_version = latest
+        return (frame, cells, attrs, conxs)
+
+
+if __name__ == "__main__":
+
+    import tempfile
+
+    filename = tempfile.mktemp()
+    writer = StateChannel(writer=True, filename=filename)
+    reader = StateChannel(filename=filename)
+    print "empty:", reader.read()
+    writer.publish(1, [(1, True), (2, False)], [(1, 'fast', 0.5)],
+                   [(1, 2, 'friends', 0.25)])
+    print "frame 1:", reader.read()
+    print "again:", reader.read()
+    for frame in range(2, 10):
+        writer.publish(frame, [(1, True)], [], [])
+    print "lapped:", reader.read()
+    writer.close()
+    reader.close()
+    os.remove(filename)
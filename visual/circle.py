@@ -17,10 +17,9 @@ __version__ = "0.1pre0"
 __license__ = "GNU GPL 3.0 or later"
 
 # core modules
-from itertools import chain
 
 # installed modules
-import pyglet
+import numpy
 
 # local modules
 from shared import config
@@ -28,22 +27,61 @@ from shared import debug
 import curves
 
 # local classes
+from redraw import is_changed
 
 # constants
 LOGFILE = config.logfile
 
 LINEMODE = config.linemode
-CURVE_SEGS = config.curve_segments  # number of line segs in a curve
+CURVE_SEGS = config.curve_segments  # most points in a curve
+CURVE_TOL = config.curve_tolerance  # how close to the curve, in pixels
 
 GRAPHMODES = config.graphic_modes
-GRAPHOPTS = {'screen': 1, 'osc': 2, 'etherdream':3}
+GRAPHOPTS = {'screen': 1, 'osc': 2, 'etherdream': 4}
 
 OSCPATH = config.oscpath
 
+# the control points of the four cubic arcs that make up a unit circle
+K = 0.5522847498307935  # 4/3 (sqrt(2)-1)
+UNIT_ARCPOINTS = [(1,0), (1,K), (K,1), (0,1), (-K,1), (-1,K), (-1,0),
+                  (-1,-K), (-K,-1), (0,-1), (K,-1), (1,-K)]
+ARC_INDEX = [(0, 1, 2, 3), (3, 4, 5, 6), (6, 7, 8, 9), (9, 10, 11, 0)]
+
+# unit circle tessellations by number of steps, see unit_circle
+_unit_circles = {}
+
 # init debugging
 dbug = debug.Debug()
 
 
+def unit_circle(nsteps):
+    """Returns the tessellation of a unit circle into arcs of nsteps points.
+
+    returns:
+        (arcs, outline_index, fill_index) where arcs is a (4 x nsteps+1 x 2)
+        array of the points of each arc, with the center last. Taking the
+        arcs as one list of points, outline_index joins them with lines,
+        and fill_index fills the circle with a fan of triangles from the
+        centers.
+    The tessellation is made once for each nsteps and kept.
+    """
+    circle = _unit_circles.get(nsteps)
+    if circle is None:
+        controls = [[UNIT_ARCPOINTS[i] for i in arc] for arc in ARC_INDEX]
+        points = curves.cubic_splines(controls, nsteps)
+        centers = numpy.zeros((len(ARC_INDEX), 1, 2))
+        arcs = numpy.concatenate((points, centers), axis=1)
+        outline_index = []
+        fill_index = []
+        for arc in range(len(ARC_INDEX)):
+            first = arc*(nsteps+1)
+            center = first + nsteps
+            outline_index += [first + i for i in curves.cubic_index(nsteps)]
+            for i in range(nsteps-1):
+                fill_index += [center, first + i, first + i + 1]
+        circle = (arcs, outline_index, fill_index)
+        _unit_circles[nsteps] = circle
+    return circle
 
 class Circle(object):
     """Define circle object.
@@ -56,8 +94,10 @@ class Circle(object):
             m_solid: is this a solid (boolean)
             m_arcpoints: the points that make up the arcs
             m_arcindex: the index to connect the above arcpoints
-            m_points: a list of points that make up the circle
-            m_index: the index to connect the above points
+            m_points: array of the points of each arc of the circle
+            m_index: the index to connect the above points, all arcs together
+            m_rendered: the (center, radius) the arcpoints were made for
+            m_drawn: what the screen shape was last drawn with, or None
 
         """
 
@@ -76,6 +116,8 @@ class Circle(object):
         # TODO: possibly these could be melded into single dim lists
         self.m_points = []
         self.m_index = []
+        self.m_rendered = None
+        self.m_drawn = None
 
     def update(self, field, p, r, color=None, solid=None, visible=None):
         """Circle constructor."""
@@ -91,17 +133,40 @@ class Circle(object):
             self.m_visible = visible
 
     def render(self):
+        # nothing to do if the circle hasn't moved or changed size (much)
+        if not is_changed(self.m_rendered, (self.m_center, self.m_radius)):
+            return
         (x,y) = self.m_center
         r = self.m_radius
-        k = 0.5522847498307935  # 4/3 (sqrt(2)-1)
-        kr = r * k
-        self.m_arcpoints = [(x+r,y), (x+r,y+kr), (x+kr,y+r), (x,y+r),
-                           (x-kr,y+r), (x-r,y+kr), (x-r,y),
-                           (x-r,y-kr), (x-kr,y-r), (x,y-r),
-                            (x+kr,y-r), (x+r,y-kr)]
-        self.m_arcindex = [(0, 1, 2, 3), (3, 4, 5, 6), (6, 7, 8, 9), (9, 10, 11, 0)]
-        self.m_points = []
-        self.m_index = []
+        self.m_arcpoints = [(x+r*px, y+r*py) for (px, py) in UNIT_ARCPOINTS]
+        self.m_arcindex = ARC_INDEX
+        self.m_rendered = (self.m_center, self.m_radius)
+        self.m_drawn = None
+
+    def draw_screen(self, renderer):
+        """Hand the circle, divided into line segments, to the renderer."""
+        # each arc of the circle is the same arc of the unit circle,
+        # scaled and moved, and already divided into line segments
+        (center, radius) = self.m_rendered
+        # the arcs are all alike, so the first says how many steps they take
+        arc = [(x*radius, y*radius)
+               for (x, y) in [UNIT_ARCPOINTS[i] for i in ARC_INDEX[0]]]
+        nsteps = curves.cubic_steps(arc[0], arc[1], arc[2], arc[3],
+                CURVE_TOL/self.m_field.m_screen_scale, CURVE_SEGS)
+        (arcs, outline_index, fill_index) = unit_circle(nsteps)
+        self.m_points = arcs*radius + numpy.array(center)
+        if self.m_solid:
+            self.m_index = fill_index
+        else:
+            self.m_index = outline_index
+        if dbug.LEV & dbug.GRAPH: print "Circle:draw:Points =",self.m_points
+        scaled_pts = self.m_field.rescale_array2screen(
+                self.m_points.reshape(-1, 2))
+        if dbug.LEV & dbug.GRAPH: print "Circle:draw:screen:scaled_pts =",scaled_pts
+        if self.m_solid:
+            renderer.triangles(self, scaled_pts, self.m_index, self.m_color)
+        else:
+            renderer.lines(self, scaled_pts, self.m_index, self.m_color)
 
     # Render functions moved into draw routine for simplicity
     #def render(self):
@@ -147,40 +212,13 @@ class Circle(object):
                 #       points = [(10.0,10.0), (20.0,0), (-10.0,10.0), etc]
                 #   an index into points describing contiguous line segments
                 #       index = [(1,2), (2, 3), (3,4), etc]
-                # for each arc in the circle, convert to line segments
-                for i in range(len(self.m_arcindex)):
-                    # e.g., self.m_arcindex[i] = (0,1,2)
-                    p0 = self.m_arcpoints[self.m_arcindex[i][0]]
-                    p1 = self.m_arcpoints[self.m_arcindex[i][1]]
-                    p2 = self.m_arcpoints[self.m_arcindex[i][2]]
-                    p3 = self.m_arcpoints[self.m_arcindex[i][3]]
-                    (points,index) = curves.cubic_spline(p0,p1,p2,p3,CURVE_SEGS)
-                    if self.m_solid:
-                        points.append(self.m_center)
-                        nxlast_pt = len(points)-2
-                        last_pt = len(points)-1
-                        xtra_index = [nxlast_pt,last_pt,last_pt,0]
-                        index = index + xtra_index
-                    self.m_points.append(points)
-                    self.m_index.append(index)
-                # now, for each segment, output a line to pyglet
-                for i in range(len(self.m_index)):
-                    points = self.m_points[i]
-                    if dbug.LEV & dbug.GRAPH: print "Circle:draw:Points =",points
-                    scaled_pts = self.m_field.rescale_pt2screen(points)
-                    if dbug.LEV & dbug.GRAPH: print "Circle:draw:screen:scaled_pts =",scaled_pts
-                    index = self.m_index[i]
-                    pyglet.gl.glColor3f(self.m_color[0],self.m_color[1],self.m_color[2])
-                    if not self.m_solid:
-                        pyglet.graphics.draw_indexed(len(scaled_pts), pyglet.gl.GL_LINES,
-                            index,
-                            ('v2i',tuple(chain(*scaled_pts))),
-                        )
-                    else:
-                        pyglet.graphics.draw_indexed(len(scaled_pts), pyglet.gl.GL_POLYGON,
-                            index,
-                            ('v2i',tuple(chain(*scaled_pts))),
-                        )
+                # if nothing has changed, the renderer still has it
+                renderer = self.m_field.m_screen.m_renderer
+                drawn = (self.m_color, self.m_solid,
+                         self.m_field.m_transform_version)
+                if self.m_drawn != drawn or not renderer.keep(self):
+                    self.draw_screen(renderer)
+                    self.m_drawn = drawn
             if GRAPHMODES & GRAPHOPTS['osc']:
                 # the laser engine wants output of this form:
                 #   /laser/bezier/cubic ffffffff
@@ -206,5 +244,11 @@ class Circle(object):
                     self.m_field.m_osc.send_laser(OSCPATH['graph_cubic'], 
                                     [p0[0], p0[1], p1[0], p1[1], 
                                      p2[0], p2[1], p3[0], p3[1]])
+            if GRAPHMODES & GRAPHOPTS['etherdream']:
+                # the point stream wants the arcs as control points, and
+                # samples them itself
+                self.m_field.m_stream.add_stroke(self.m_color,
+                        [[self.m_arcpoints[j] for j in arc]
+                         for arc in self.m_arcindex])
 
 
@@ -17,6 +17,7 @@ __version__ = "0.1pre0"
 __license__ = "GNU GPL 3.0 or later"
 
 # core modules
+from math import sqrt, ceil
 
 # installed modules
 import numpy
@@ -29,6 +30,8 @@ from shared import debug
 
 # constants
 
+# cubic Bernstein bases by number of steps, see cubic_basis
+_cubic_bases = {}
 
 # init debugging
 dbug = debug.Debug()
@@ -69,27 +72,89 @@ def quad_spline(p0, p1, p2, nsteps):
     quadindex = [0] + [int(x * 0.5) for x in range(2, (nsteps)*2)] + [nsteps]
     return (linesegments,quadindex)
 
+def cubic_basis(nsteps):
+    """Returns the cubic Bernstein basis for nsteps values of t in [0,1].
+
+    Row i holds the weights of the four control points at the ith t, so
+    the points of a cubic are the basis times its (4 x 2) control points.
+    The basis is made once for each nsteps and kept.
+    """
+    basis = _cubic_bases.get(nsteps)
+    if basis is None:
+        t = numpy.linspace(0, 1, nsteps)
+        s = 1 - t
+        basis = numpy.column_stack((s*s*s, 3*s*s*t, 3*s*t*t, t*t*t))
+        _cubic_bases[nsteps] = basis
+    return basis
+
+def cubic_index(nsteps):
+    """Returns the index that joins nsteps points of a curve with lines."""
+    return [0] + [int(x * 0.5) for x in range(2, (nsteps-1)*2)] + [nsteps-1]
+
+def cubic_lengths(controls):
+    """Returns the lengths of a batch of cubics, near enough.
+
+    controls is an (m x 4 x 2) array of the control points of m cubics,
+    or anything that reshapes to one, such as m rows of 8 floats. We take
+    the mean of each cubic's chord and its control polygon, which is
+    close enough to count points with.
+    """
+    c = numpy.asarray(controls, dtype=float).reshape(-1, 4, 2)
+    chord = numpy.hypot(*(c[:, 3] - c[:, 0]).T)
+    poly = numpy.hypot(*numpy.diff(c, axis=1).T).sum(axis=0)
+    return (chord + poly)/2
+
+def cubic_flatness(p0, p1, p2, p3):
+    """Returns how far a cubic is from straight.
+
+    That's the larger of the second differences of its control points,
+    which is zero for a straight line with evenly spaced controls.
+    """
+    return max(sqrt((p0[0] - 2*p1[0] + p2[0])**2 +
+                    (p0[1] - 2*p1[1] + p2[1])**2),
+               sqrt((p1[0] - 2*p2[0] + p3[0])**2 +
+                    (p1[1] - 2*p2[1] + p3[1])**2))
+
+def cubic_steps(p0, p1, p2, p3, tolerance, maxsteps):
+    """Returns how many steps a cubic needs to stay within tolerance.
+
+    Wang's formula: n line segments, evenly spaced in t, are never more
+    than tolerance from a cubic if n >= sqrt(3/4 * flatness / tolerance).
+    The tolerance is in the units of the points, so scale the points to
+    pixels (or DAC units) first for a tolerance in pixels. We return the
+    number of points, as cubic_spline takes it, from 2 (a straight line)
+    to maxsteps.
+    """
+    if tolerance <= 0:
+        return maxsteps
+    flatness = cubic_flatness(p0, p1, p2, p3)
+    nsegs = int(ceil(sqrt(0.75*flatness/tolerance)))
+    return min(maxsteps, max(2, nsegs + 1))
+
 def cubic_spline(p0, p1, p2, p3, nsteps):
     """Returns a list of line segments and an index to make the full curve.
 
     Cubics are defined as a start point (p0) and end point (p3) and
     control points (p1 & p2) and a parameter t that goes from 0.0 to 1.0.
     """
-    points = numpy.array([p0, p1, p2, p3])
-    bez = bezier_curve( points )
-    linesegments = []
-    for val in numpy.linspace( 0, 1, nsteps ):
-        #print '%s: %s' % (val, bez( val ))
-        # the definition of the spline means the parameter t goes
-        # from 0.0 to 1.0
-        (x,y) = bez(val)
-        linesegments.append((x,y))
-    #lineSegments.append(p2)
-    cubicindex = [0] + [int(x * 0.5) for x in range(2, (nsteps-1)*2)] + [nsteps-1]
+    points = numpy.dot(cubic_basis(nsteps),
+                       numpy.array([p0, p1, p2, p3], dtype=float))
+    linesegments = [tuple(p) for p in points.tolist()]
+    cubicindex = cubic_index(nsteps)
     #print "lineSegments = ",lineSegments
     #print "cubicIndex = ",cubicIndex
     return (linesegments,cubicindex)
 
+def cubic_splines(controls, nsteps):
+    """Returns the points of a batch of cubics.
+
+    controls is an (m x 4 x 2) array of the control points of m cubics,
+    and we return an (m x nsteps x 2) array of their points, each the
+    same as cubic_spline would give. They all use cubic_index(nsteps).
+    """
+    return numpy.einsum('sk,mkd->msd', cubic_basis(nsteps),
+                        numpy.asarray(controls, dtype=float))
+
 
 def fac( k ):
     '''
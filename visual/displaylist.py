@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Packed display list for the laser engine.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "displaylist.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+import struct
+
+# installed modules
+
+# local modules
+from shared import config
+
+# local classes
+from shared import debug
+
+# constants
+LOGFILE = config.logfile
+
+OSCPATH = config.oscpath
+
+# room in a datagram for the OSC address, type tags, ints and blob size
+MAX_PART = config.osc_max_datagram - 64
+
+# record opcodes, each followed by its payload, little-endian
+OP_COLOR = 1        # r, g, b as 3 floats
+OP_DENSITY = 7      # points per m as 1 float
+OP_CUBIC = 2        # x0, y0, x1, y1, x2, y2, x3, y3 as 8 floats
+OP_BEGIN_CELL = 3   # id as a byte count and that many bytes
+OP_END_CELL = 4
+OP_BEGIN_CONX = 5
+OP_END_CONX = 6
+
+COLOR_REC = struct.Struct('<B3f')
+DENSITY_REC = struct.Struct('<Bf')
+CUBIC_REC = struct.Struct('<B8f')
+ID_REC = struct.Struct('<BB')
+
+# the laser messages we can pack, and how
+FLOAT_OPS = {
+    OSCPATH['graph_color']: (OP_COLOR, COLOR_REC),
+    OSCPATH['graph_density']: (OP_DENSITY, DENSITY_REC),
+    OSCPATH['graph_cubic']: (OP_CUBIC, CUBIC_REC),
+}
+ID_OPS = {
+    OSCPATH['graph_begin_cell']: OP_BEGIN_CELL,
+    OSCPATH['graph_end_cell']: OP_END_CELL,
+    OSCPATH['graph_begin_conx']: OP_BEGIN_CONX,
+    OSCPATH['graph_end_conx']: OP_END_CONX,
+}
+
+# init debugging
+dbug = debug.Debug()
+
+
+class DisplayList(object):
+    """A frame's worth of laser geometry, packed.
+
+    In place of the color, cubic, and begin and end messages for each cell
+    and connector, the frame is gathered up here as a list of binary
+    records, and sent when the frame is done, as blobs of whole records
+    that each fit in a datagram.
+
+    Stores the following values:
+        m_records: packed records of this frame so far
+        m_size: total size of the records
+
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.m_records = []
+        self.m_size = 0
+
+    def add(self, path, args):
+        """Add a laser message to the list.
+
+        Returns False if it isn't one we know how to pack.
+        """
+        if path in FLOAT_OPS:
+            (op, rec) = FLOAT_OPS[path]
+            record = rec.pack(op, *args)
+        elif path in ID_OPS:
+            id = str(args[0])[:255]
+            record = ID_REC.pack(ID_OPS[path], len(id)) + id
+        else:
+            return False
+        self.m_records.append(record)
+        self.m_size += len(record)
+        return True
+
+    def parts(self):
+        """Return the records as a list of blobs of at most MAX_PART bytes.
+
+        A frame with nothing in it is still one (empty) part, so that the
+        laser engine hears about the frame.
+        """
+        parts = []
+        part = []
+        size = 0
+        for record in self.m_records:
+            if part and size + len(record) > MAX_PART:
+                parts.append(''.join(part))
+                part = []
+                size = 0
+            part.append(record)
+            size += len(record)
+        parts.append(''.join(part))
+        return parts
+
+
+def unpack(blob):
+    """Return the records of a blob as a list of (op, values).
+
+    This is what the laser engine does with a part; it's here to document
+    the format and to check it.
+    """
+    records = []
+    offset = 0
+    while offset < len(blob):
+        op = ord(blob[offset])
+        if op == OP_COLOR:
+            values = COLOR_REC.unpack_from(blob, offset)[1:]
+            offset += COLOR_REC.size
+        elif op == OP_DENSITY:
+            values = DENSITY_REC.unpack_from(blob, offset)[1:]
+            offset += DENSITY_REC.size
+        elif op == OP_CUBIC:
+            values = CUBIC_REC.unpack_from(blob, offset)[1:]
+            offset += CUBIC_REC.size
+        else:
+            n = ID_REC.unpack_from(blob, offset)[1]
+            offset += ID_REC.size
+            values = (blob[offset:offset+n],)
+            offset += n
+        records.append((op, values))
+    return records
+
+
+if __name__ == "__main__":
+
+    dlist = DisplayList()
+    for cell in range(30):
+        dlist.add(OSCPATH['graph_begin_cell'], [cell])
+        dlist.add(OSCPATH['graph_color'], [1.0, 0.5, 0.0])
+        for arc in range(4):
+            dlist.add(OSCPATH['graph_cubic'], [0.0, 1.0, 2.0, 3.0,
+                                               4.0, 5.0, 6.0, 7.0])
+        dlist.add(OSCPATH['graph_end_cell'], [cell])
+    print "density:", dlist.add(OSCPATH['graph_density'], [50.0])
+    print "unpackable:", dlist.add(OSCPATH['graph_pps'], [30000])
+    parts = dlist.parts()
+    print "records:", len(dlist.m_records), "bytes:", dlist.m_size, \
+          "parts:", [len(part) for part in parts]
+    print "first records:", unpack(parts[0])[:3]
+    print "all there:", sum(len(unpack(part)) for part in parts) == \
+          len(dlist.m_records)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Incremental pathfinding module
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "dstarlite.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+import heapq
+
+# installed modules
+
+# local modules
+from shared import config
+
+# local classes
+from gridmap import PATH_COST_ZIG
+
+# constants
+LOGFILE = config.logfile
+
+INF = float('inf')
+
+# directions we can move in, in the same order as GridMap.successors, and
+# the direction of a state we didn't arrive at from anywhere (the start)
+DIRS = ((0, -1), (-1, 0), (0, 1), (1, 0))
+NODIR = 4
+NSTATES = 5
+
+# if more than this fraction of the grid has changed, start over
+MAX_CHANGED = 0.25
+
+
+class DStarLite(object):
+    """ Keeps a path between two moving points up to date with D* Lite.
+
+        D* Lite searches backward from the goal, and when the start moves or
+        costs change, it repairs only the part of the search that depends on
+        them, so a path that changes a bit each frame costs a bit each frame.
+
+        The costs are GridMap.move_cost's: a step, plus twice the cost of the
+        square we step into, plus PATH_COST_ZIG when we turn. So that turns
+        can be costed, a state is a square together with the direction we
+        came into it from. The midpoint bonus (PATH_COST_MID) is not used
+        here, since it moves with the endpoints and would change costs all
+        over the grid each time they moved.
+
+        If the goal moves to another square, the search starts over, since
+        D* Lite can only follow a moving start.
+
+        Stores the following values:
+            grid: the GridMap we plan over
+            start, goal: the path-scaled endpoints of the last plan
+            last_start: where the start was when km was last updated
+            km: the key modifier, accumulated as the start moves
+            g, rhs: dicts of cost estimates by state id
+            queue: dict of the key of each queued state id
+            heap: heap of (key, state id), some of them stale
+            last_map: copy of the grid's costs the last time we planned
+
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.start = None
+        self.goal = None
+        self.stride = grid.ymax + 1
+        # (dx, dy, change in cell index) for each direction
+        self.moves = [(dx, dy, dx*self.stride + dy) for (dx, dy) in DIRS]
+
+    # State ids: ((x * stride) + y) * NSTATES + direction
+
+    def state(self, x, y, d):
+        return (x*self.stride + y)*NSTATES + d
+
+    def coords(self, s):
+        (cell, d) = divmod(s, NSTATES)
+        (x, y) = divmod(cell, self.stride)
+        return (x, y, d)
+
+    def key(self, s):
+        m = min(self.g.get(s, INF), self.rhs.get(s, INF))
+        (x, y) = divmod(s // NSTATES, self.stride)
+        h = ((x - self.start[0]) ** 2 + (y - self.start[1]) ** 2) ** 0.5
+        return (m + h + self.km, m)
+
+    def successors(self, s):
+        """ Return [(state, cost)] of the states we can step to from s. """
+        (x, y, d) = self.coords(s)
+        xmax = self.grid.xmax
+        ymax = self.grid.ymax
+        cost = self.grid.map.item
+        succs = []
+        for (nd, (dx, dy)) in enumerate(DIRS):
+            nx = x + dx
+            ny = y + dy
+            if 0 <= nx < xmax and 0 <= ny < ymax:
+                c = 1 + 2*cost(nx*self.stride + ny)
+                # turning: we leave in a direction across the one we came in
+                if d != NODIR and (d - nd) % 2:
+                    c += PATH_COST_ZIG
+                succs.append((self.state(nx, ny, nd), c))
+        return succs
+
+    def predecessors(self, s):
+        """ Return the states that can step to s. """
+        (x, y, d) = self.coords(s)
+        if d == NODIR:
+            return []
+        (dx, dy) = DIRS[d]
+        px = x - dx
+        py = y - dy
+        if not (0 <= px < self.grid.xmax and 0 <= py < self.grid.ymax):
+            return []
+        base = self.state(px, py, 0)
+        return range(base, base + NSTATES)
+
+    def is_goal(self, s):
+        return s // NSTATES == self.goal_cell
+
+    # The priority queue
+
+    def push(self, s):
+        key = self.key(s)
+        self.queue[s] = key
+        heapq.heappush(self.heap, (key, s))
+
+    def top(self):
+        """ Return (key, state) at the top of the queue, skipping stale. """
+        heap = self.heap
+        while heap:
+            (key, s) = heap[0]
+            if self.queue.get(s) == key:
+                return (key, s)
+            heapq.heappop(heap)
+        return ((INF, INF), None)
+
+    # D* Lite
+
+    def reset(self, start, goal):
+        self.start = start
+        self.goal = goal
+        self.last_start = start
+        self.goal_cell = goal[0]*self.stride + goal[1]
+        self.km = 0
+        self.g = {}
+        self.rhs = {}
+        self.queue = {}
+        self.heap = []
+        for d in range(NSTATES):
+            s = self.state(goal[0], goal[1], d)
+            self.rhs[s] = 0
+            self.push(s)
+        self.last_map = self.grid.copy_map()
+
+    def update_vertex(self, s):
+        (cell, d) = divmod(s, NSTATES)
+        if cell != self.goal_cell:
+            # the same as looking through successors(s), but this is
+            # where we spend our time
+            (x, y) = divmod(cell, self.stride)
+            xmax = self.grid.xmax
+            ymax = self.grid.ymax
+            cost = self.grid.map.item
+            g = self.g
+            best = INF
+            nd = 0
+            for (dx, dy, dcell) in self.moves:
+                if 0 <= x + dx < xmax and 0 <= y + dy < ymax:
+                    ncell = cell + dcell
+                    v = g.get(ncell*NSTATES + nd, INF)
+                    if v < best:
+                        v += 1 + 2*cost(ncell)
+                        if d != NODIR and (d - nd) % 2:
+                            v += PATH_COST_ZIG
+                        if v < best:
+                            best = v
+                nd += 1
+            self.rhs[s] = best
+        if s in self.queue:
+            del self.queue[s]
+        if self.g.get(s, INF) != self.rhs.get(s, INF):
+            self.push(s)
+
+    def compute_shortest_path(self):
+        start = self.state(self.start[0], self.start[1], NODIR)
+        g = self.g
+        rhs = self.rhs
+        while True:
+            (k_old, u) = self.top()
+            if u is None:
+                break
+            if not (k_old < self.key(start) or
+                    rhs.get(start, INF) != g.get(start, INF)):
+                break
+            heapq.heappop(self.heap)
+            del self.queue[u]
+            k_new = self.key(u)
+            if k_old < k_new:
+                self.push(u)
+            elif g.get(u, INF) > rhs.get(u, INF):
+                g[u] = rhs[u]
+                for s in self.predecessors(u):
+                    self.update_vertex(s)
+            else:
+                g[u] = INF
+                self.update_vertex(u)
+                for s in self.predecessors(u):
+                    self.update_vertex(s)
+
+    def update_costs(self):
+        """ Repair the search where the grid's costs have changed.
+
+        Returns False if too much has changed and we should start over.
+        """
+        changed = self.grid.changed_squares(self.last_map)
+        if len(changed) > MAX_CHANGED*self.grid.xmax*self.grid.ymax:
+            return False
+        for (x, y) in changed:
+            # the cost of stepping into (x, y) changed, so did the rhs of
+            # every state that can step there
+            for d in range(len(DIRS)):
+                for s in self.predecessors(self.state(x, y, d)):
+                    self.update_vertex(s)
+        self.last_map = self.grid.copy_map()
+        return True
+
+    def plan(self, start, goal):
+        """ Return a path from start to goal, repairing the last plan.
+
+        args:
+            start = path-scaled start point
+            goal = path-scaled goal point
+        returns:
+            path-scaled list of points that make up the path, or [] if
+            there is none
+        """
+        start = (int(start[0]), int(start[1]))
+        goal = (int(goal[0]), int(goal[1]))
+        xmax = self.grid.xmax
+        ymax = self.grid.ymax
+        if not (0 <= start[0] < xmax and 0 <= start[1] < ymax and
+                0 <= goal[0] < xmax and 0 <= goal[1] < ymax):
+            return []
+        if goal != self.goal:
+            self.reset(start, goal)
+        else:
+            self.start = start
+            self.km += ((self.last_start[0] - start[0]) ** 2 +
+                        (self.last_start[1] - start[1]) ** 2) ** 0.5
+            self.last_start = start
+            if not self.update_costs():
+                self.reset(start, goal)
+        self.compute_shortest_path()
+        return self.extract_path()
+
+    def extract_path(self):
+        s = self.state(self.start[0], self.start[1], NODIR)
+        if self.g.get(s, INF) == INF:
+            return []
+        path = [self.start]
+        g = self.g
+        # there can't be more steps than states
+        for i in xrange(len(g) + 1):
+            if self.is_goal(s):
+                return path
+            best = INF
+            for (succ, c) in self.successors(s):
+                v = c + g.get(succ, INF)
+                if v < best:
+                    best = v
+                    next = succ
+            if best == INF:
+                return []
+            s = next
+            (x, y, d) = self.coords(s)
+            path.append((x, y))
+        return []
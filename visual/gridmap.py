@@ -18,6 +18,7 @@ __license__ = "GNU GPL 3.0 or later"
 
 # core modules
 import sys
+import heapq
 import numpy
 
 # installed modules
@@ -42,10 +43,31 @@ DRAW_PATH_BLOCK = '0'
 
 MAX_CIRCLE_RADIUS = 20
 
+# obstacle changes are tracked in tiles of this many squares on a side
+TILE_SIZE = 8
+
+# hierarchical paths are planned first on a coarse grid of clusters of this
+# many squares on a side, if the ends are at least this many clusters apart
+CLUSTER_SIZE = 8
+HIER_MIN_CLUSTERS = 3
+
 
 # init debugging
 dbug = debug.Debug()
 
+def _span(a0, a1, inclusive):
+    """ The coordinates that easy_path steps through going from a0 to a1.
+
+    Like enumXpath (inclusive) and enumYpath (not inclusive, but only going
+    up) in easy_path.
+    """
+    if a0 < a1:
+        if inclusive:
+            return numpy.arange(a0, a1 + 1)
+        return numpy.arange(a0, a1)
+    return numpy.arange(a0, a1 - 1, -1)
+
+
 class GridMap(object):
     """ Represents a rectangular grid map. The map consists of 
         xmax X ymax coordinates (squares). Some of the squares
@@ -55,83 +77,228 @@ class GridMap(object):
     def __init__(self, xmax, ymax):
         """ Create a new GridMap with the given amount of x and y squares.  """
         self.max_r = 0
-        self.opencircle = []
-        self.solidcircle = []
         self.xmax = xmax
         self.ymax = ymax
 
         #self.map = [[0] * self.ymax+1 for i in range(self.xmax+1)]
-        self.map = numpy.zeros((self.xmax+1,self.ymax+1))
+        self.map = numpy.zeros((self.xmax+1,self.ymax+1), dtype=numpy.uint8)
+        # regions of the map written since the last reset, as (x0,x1,y0,y1)
+        self.dirty = []
+        # flat A* work arrays, indexed by x*(ymax+1)+y; an entry is only
+        # valid if its stamp matches the current search number
+        size = (self.xmax+1)*(self.ymax+1)
+        self.search = 0
+        self.g_cost = [0]*size
+        self.parent = [-1]*size
+        self.opened = [0]*size
+        self.closed = [0]*size
+        # obstacle versioning, so that cached paths can tell if something
+        # has changed along them. Obstacles are keyed by what made them, and
+        # the tiles they cover get a new version when one appears or goes.
+        self.version = 0
+        self.tile_version = {}
+        self.blocks = {}
+        self.last_blocks = {}
+        self.lines = {}
+        self.last_lines = {}
+        # the coarse grid for hierarchical paths, made when first needed,
+        # and the cluster each of our squares is in
+        self.coarse = None
+        self.coarse_version = -1
+        self.ccols = (self.xmax + CLUSTER_SIZE - 1) // CLUSTER_SIZE
+        self.crows = (self.ymax + CLUSTER_SIZE - 1) // CLUSTER_SIZE
+        self.cluster_of = [(x // CLUSTER_SIZE)*self.crows + y // CLUSTER_SIZE
+                           for x in range(self.xmax+1)
+                           for y in range(self.ymax+1)]
         #self.blocked = defaultdict(lambda: False)
         self.gen_circles(MAX_CIRCLE_RADIUS)
 
     def reset_grid(self):
-        """ Resets the grid between frames. """
-        #self.map = [[0] * self.ymax for i in range(self.xmax)]
-        self.map = numpy.zeros((self.xmax,self.ymax))
+        """ Resets the grid between frames.
+
+        Only the regions touched since the last reset are cleared.
+        """
+        for (x0, x1, y0, y1) in self.dirty:
+            self.map[x0:x1, y0:y1] = 0
+        self.dirty = []
+        # lines are laid down after the paths are checked, so we can only
+        # see which ones have gone now, a frame late
+        for key, rect in self.last_lines.iteritems():
+            if key not in self.lines:
+                self.touch(rect)
+        self.last_lines = self.lines
+        self.lines = {}
+        self.last_blocks = self.blocks
+        self.blocks = {}
+
+    def finish_blocks(self):
+        """ Note the obstacles that were there last frame but not this one.
+
+        Call this after the last set_blocked of a frame.
+        """
+        for key, rect in self.last_blocks.iteritems():
+            if key not in self.blocks:
+                self.touch(rect)
+        self.last_blocks = {}
+
+    def touch(self, rect):
+        """ Give the tiles under rect (x0,x1,y0,y1) a new version. """
+        (x0, x1, y0, y1) = rect
+        self.version += 1
+        for tx in range(x0 // TILE_SIZE, (x1 - 1) // TILE_SIZE + 1):
+            for ty in range(y0 // TILE_SIZE, (y1 - 1) // TILE_SIZE + 1):
+                self.tile_version[(tx, ty)] = self.version
+
+    def copy_map(self):
+        """ Return a copy of the cost map. """
+        return self.map.copy()
+
+    def changed_squares(self, old_map):
+        """ Return the (x, y) of the squares whose cost differs in old_map. """
+        return [(int(x), int(y))
+                for (x, y) in numpy.argwhere(self.map != old_map)]
+
+    def path_tiles(self, path):
+        """ Return the set of tiles a path crosses. """
+        return set([(int(x) // TILE_SIZE, int(y) // TILE_SIZE)
+                    for (x, y) in path])
+
+    def is_path_current(self, tiles, version):
+        """ Has nothing changed in these tiles since version? """
+        for tile in tiles:
+            if self.tile_version.get(tile, 0) > version:
+                return False
+        return True
 
     def gen_circles (self, max_r):
-        """ Pre-generate circles to some maximum radius. """
+        """ Pre-generate circles to some maximum radius.
+
+        Each circle is a boolean disk mask of shape (2*k_r+1, 2*k_r+1),
+        centered on the middle element.
+        """
         self.max_r = max_r
+        self.disk = []
+        self.stamps = {}
         for k_r in range(max_r + 1):
-            k_r_sq = k_r ** 2
-            newlist = []
-            for x in range(-max_r, max_r + 1):
-                x_sq = x ** 2
-                for y in range(-max_r, max_r + 1):
-                    y_sq = y ** 2
-                    #if x_sq + y_sq <= k_r_sq and x_sq + y_sq >= (k_r_sq - 8):
-                    if x_sq + y_sq <= k_r_sq:
-                        newlist.append((x,y))
-            self.solidcircle.append(newlist)
-            if k_r > 1:
-                #print "k_r:",k_r
-                #print "opencircle(",k_r,"):",newlist," minus ",self.solidcircle[k_r -2]
-                newlist = [x for x in newlist if x not in self.solidcircle[k_r - 1]]
-            self.opencircle.append(newlist)
+            (x, y) = numpy.ogrid[-k_r:k_r+1, -k_r:k_r+1]
+            self.disk.append(x**2 + y**2 <= k_r**2)
+
+    def get_stamp(self, r, f):
+        """ Return the cost stamp for a circle of radius r with f fuzzy rings.
+
+        The stamp is a square array of side 2*(r+f)+1 holding PATH_COST_PROX[0]
+        within the circle, PATH_COST_PROX[i] in the i-th ring around it, and
+        zero outside. Stamps are made once and cached.
+        """
+        if (r, f) not in self.stamps:
+            n = r + f
+            stamp = numpy.zeros((2*n + 1, 2*n + 1), dtype=numpy.uint8)
+            # paint the outer rings first and the solid circle last
+            for i in reversed(range(f + 1)):
+                k_r = r + i
+                ofs = n - k_r
+                area = stamp[ofs:ofs+2*k_r+1, ofs:ofs+2*k_r+1]
+                area[self.disk[k_r]] = PATH_COST_PROX[i]
+            self.stamps[(r, f)] = stamp
+        return self.stamps[(r, f)]
 
     def set_blocked(self, p, r, f):
         """Set the blocked state of a coordinate. 
 
         Takes an integer value that represents the fuzzy cost around the circle.
+        Where obstacles overlap, the higher cost wins.
 
         """
 
         # the number of circles we've pregenerated
-        n = len(self.solidcircle) - 1
+        n = len(self.disk) - 1
         # if r is higher than the number we've pregen'd, trim it
         r = int(min(r,n))
         # if r + f is higher than the number we've pregen'd, trim it
         if r + f > n:
             f = int(max(0, n - r))
 
-        (cx,cy) = p
-        for i in range(f + 1):
-            if i == 0:
-                for j in range(len(self.solidcircle[r])):
-                    (relx,rely) = self.solidcircle[r][j]
-                    x = cx + relx
-                    y = cy + rely
-                    if 0 <= x < self.xmax and \
-                       0 <= y < self.ymax:
-                        self.map[x][y] = PATH_COST_PROX[i]
-            else:
-                for j in range(len(self.opencircle[r+i])):
-                    (relx,rely) = self.opencircle[r+i][j]
-                    x = cx + relx
-                    y = cy + rely
-                    if 0 <= x < self.xmax and \
-                       0 <= y < self.ymax:
-                        self.map[x][y] = PATH_COST_PROX[i]
+        stamp = self.get_stamp(r, f)
+        reach = r + f
+        (cx,cy) = (int(p[0]), int(p[1]))
+        # clip the stamp to the grid
+        x0 = max(cx - reach, 0)
+        x1 = min(cx + reach + 1, self.xmax)
+        y0 = max(cy - reach, 0)
+        y1 = min(cy + reach + 1, self.ymax)
+        if x0 >= x1 or y0 >= y1:
+            return
+        key = (cx, cy, r, f)
+        self.blocks[key] = (x0, x1, y0, y1)
+        if key not in self.last_blocks:
+            self.touch((x0, x1, y0, y1))
+        self.dirty.append((x0, x1, y0, y1))
+        area = self.map[x0:x1, y0:y1]
+        numpy.maximum(area, stamp[x0-cx+reach:x1-cx+reach,
+                                  y0-cy+reach:y1-cy+reach], out=area)
 
     def set_block_line(self, pathlist):
         """Sets the blocked state of an entire path."""
+        xs = []
+        ys = []
+        allxs = []
+        allys = []
         for p in pathlist:
             (x,y) = p
             if 0 <= x < self.xmax and \
                0 <= y < self.ymax:
+                allxs.append(x)
+                allys.append(y)
                 if not self.map[x][y]:
                     self.map[x][y] = PATH_COST_LINE
+                    xs.append(x)
+                    ys.append(y)
+        if xs:
+            self.dirty.append((int(min(xs)), int(max(xs)) + 1,
+                               int(min(ys)), int(max(ys)) + 1))
+        if allxs:
+            self.note_line(tuple(pathlist),
+                           (int(min(allxs)), int(max(allxs)) + 1,
+                            int(min(allys)), int(max(allys)) + 1))
+
+    def crosses_line(self, pathlist):
+        """Does a path go through a square a line has been laid in?"""
+        for (x, y) in pathlist:
+            if 0 <= x < self.xmax and 0 <= y < self.ymax and \
+               self.map[x][y] == PATH_COST_LINE:
+                return True
+        return False
+
+    def set_block_lines(self, paths):
+        """Sets the blocked state of a list of paths in one go.
+
+        Does the same as set_block_line for each path, but takes (n, 2)
+        integer arrays, like those from easy_path_array, and writes them
+        into the map with one fancy-indexed assignment.
+        """
+        if not paths:
+            return
+        points = numpy.concatenate(paths)
+        xs = points[:, 0]
+        ys = points[:, 1]
+        inside = (xs >= 0) & (xs < self.xmax) & (ys >= 0) & (ys < self.ymax)
+        xs = xs[inside]
+        ys = ys[inside]
+        if not len(xs):
+            return
+        free = self.map[xs, ys] == 0
+        self.map[xs[free], ys[free]] = PATH_COST_LINE
+        rect = (int(xs.min()), int(xs.max()) + 1,
+                int(ys.min()), int(ys.max()) + 1)
+        self.dirty.append(rect)
+        # we note them as one line; if any of them changes, it's all new
+        self.note_line(points.tostring(), rect)
+
+    def note_line(self, key, rect):
+        """Note a line for this frame, and a change if it's a new one."""
+        self.lines[key] = rect
+        if key not in self.last_lines:
+            self.touch(rect)
 
     def midpoint(self, p1, p2):
         return ((p1[0]+p2[0])/2, (p1[1]+p2[1])/2)
@@ -190,6 +357,193 @@ class GridMap(object):
 
         return slist
 
+    def grid_path(self, start, goal, allowed=None):
+        """ Find a path with A* directly on the cost map.
+
+        This finds the same kind of path as PathFinder with our successors
+        and move_cost, including the penalty for zigs and the bonus for the
+        midpoint lines, but works on flat arrays of costs and parents
+        indexed by integer-encoded coordinates instead of node objects.
+
+        args:
+            start = path-scaled start point
+            goal = path-scaled goal point
+            allowed = optional list, by cluster, of whether the path may
+                go through that cluster
+        returns:
+            path-scaled list of points that make up the path, or [] if
+            either end is off the grid
+        """
+        xmax = self.xmax
+        ymax = self.ymax
+        (sx, sy) = (int(start[0]), int(start[1]))
+        (gx, gy) = (int(goal[0]), int(goal[1]))
+        if not (0 <= sx < xmax and 0 <= sy < ymax and
+                0 <= gx < xmax and 0 <= gy < ymax):
+            return []
+        (mx, my) = self.midpoint((sx, sy), (gx, gy))
+        stride = ymax + 1
+        # neighbors in the same order as successors()
+        offsets = ((0, -1, -1), (-1, 0, -stride), (0, 1, 1), (1, 0, stride))
+        cost = self.map.item
+        cluster_of = self.cluster_of
+        g_cost = self.g_cost
+        parent = self.parent
+        opened = self.opened
+        closed = self.closed
+        self.search += 1
+        search = self.search
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        start_i = sx*stride + sy
+        goal_i = gx*stride + gy
+        g_cost[start_i] = 0
+        parent[start_i] = -1
+        opened[start_i] = search
+        heap = [(((sx - gx) ** 2 + (sy - gy) ** 2) ** 0.5, start_i)]
+        while heap:
+            i = heappop(heap)[1]
+            if closed[i] == search:
+                continue
+            closed[i] = search
+            if i == goal_i:
+                break
+            (x, y) = divmod(i, stride)
+            pred = parent[i]
+            g = g_cost[i]
+            for (dx, dy, di) in offsets:
+                nx = x + dx
+                ny = y + dy
+                if not (0 <= nx < xmax and 0 <= ny < ymax):
+                    continue
+                n = i + di
+                if closed[n] == search:
+                    continue
+                if allowed is not None and not allowed[cluster_of[n]]:
+                    continue
+                # as move_cost: one step, plus the proximity cost (twice)
+                score = g + 1 + 2*cost(n)
+                if pred >= 0:
+                    (px, py) = divmod(pred, stride)
+                    if nx != px and ny != py:
+                        score += PATH_COST_ZIG
+                if nx == mx or ny == my:
+                    score -= PATH_COST_MID
+                if opened[n] != search or score < g_cost[n]:
+                    opened[n] = search
+                    g_cost[n] = score
+                    parent[n] = i
+                    heappush(heap, (score +
+                        ((nx - gx) ** 2 + (ny - gy) ** 2) ** 0.5, n))
+        else:
+            return []
+
+        path = []
+        i = goal_i
+        while i >= 0:
+            path.append(divmod(i, stride))
+            i = parent[i]
+        path.reverse()
+        return path
+
+    def coarse_grid(self):
+        """ Return the coarse grid, with its costs brought up to date.
+
+        Each square of the coarse grid is a cluster of CLUSTER_SIZE squares
+        on a side, with the mean cost of the squares in it.
+        """
+        if self.coarse is None:
+            self.coarse = GridMap(self.ccols, self.crows)
+        if self.coarse_version != self.version:
+            size = CLUSTER_SIZE
+            padded = numpy.zeros((self.ccols*size, self.crows*size))
+            padded[:self.xmax, :self.ymax] = self.map[:self.xmax, :self.ymax]
+            means = padded.reshape(self.ccols, size, self.crows, size).\
+                    mean(axis=3).mean(axis=1)
+            self.coarse.map[:self.ccols, :self.crows] = numpy.rint(means)
+            self.coarse_version = self.version
+        return self.coarse
+
+    def hier_path(self, start, goal):
+        """ Find a path coarse-to-fine.
+
+        For ends that are far apart, we first find a path through the
+        clusters of the coarse grid, then the full path on our grid, but
+        only through the clusters on or next to the coarse path. Ends that
+        are near each other are planned on our grid directly, and if the
+        coarse plan fails, so is anything else.
+
+        args:
+            start = path-scaled start point
+            goal = path-scaled goal point
+        returns:
+            path-scaled list of points that make up the path
+        """
+        (sx, sy) = (int(start[0]), int(start[1]))
+        (gx, gy) = (int(goal[0]), int(goal[1]))
+        if not (0 <= sx < self.xmax and 0 <= sy < self.ymax and
+                0 <= gx < self.xmax and 0 <= gy < self.ymax):
+            return []
+        cstart = (sx // CLUSTER_SIZE, sy // CLUSTER_SIZE)
+        cgoal = (gx // CLUSTER_SIZE, gy // CLUSTER_SIZE)
+        if abs(cstart[0] - cgoal[0]) + abs(cstart[1] - cgoal[1]) < \
+                HIER_MIN_CLUSTERS:
+            return self.grid_path(start, goal)
+        cpath = self.coarse_grid().grid_path(cstart, cgoal)
+        if not cpath:
+            return self.grid_path(start, goal)
+        # the corridor: the coarse path and the clusters around it
+        allowed = [False]*(self.ccols*self.crows)
+        for (tx, ty) in cpath:
+            for nx in range(max(tx - 1, 0), min(tx + 2, self.ccols)):
+                for ny in range(max(ty - 1, 0), min(ty + 2, self.crows)):
+                    allowed[nx*self.crows + ny] = True
+        path = self.grid_path(start, goal, allowed)
+        if not path:
+            path = self.grid_path(start, goal)
+        return path
+
+    def easy_path_array(self, start, goal):
+        """ Return the same path as easy_path, as an (n, 2) integer array.
+
+        Each straight run is made with one arange, instead of a point at a
+        time.
+        """
+        (x0, y0) = (int(start[0]), int(start[1]))
+        (x1, y1) = (int(goal[0]), int(goal[1]))
+        xs = []
+        ys = []
+
+        def xrun(xa, xb, y):
+            run = _span(xa, xb, True)
+            xs.append(run)
+            ys.append(numpy.repeat(y, len(run)))
+
+        def yrun(ya, yb, x):
+            run = _span(ya, yb, False)
+            xs.append(numpy.repeat(x, len(run)))
+            ys.append(run)
+
+        xdif = abs(x0 - x1)
+        ydif = abs(y0 - y1)
+        if not xdif:
+            yrun(y0, y1, x0)
+        elif not ydif:
+            xrun(x0, x1, y0)
+        elif (xdif > ydif):
+            xmid = (x0 + x1)/2
+            xrun(x0, xmid, y0)
+            yrun(y0, y1, xmid)
+            xrun(xmid, x1, y1)
+        else:
+            ymid = (y0 + y1)/2
+            yrun(y0, ymid, x0)
+            xrun(x0, x1, ymid)
+            yrun(ymid, y1, x1)
+        return numpy.column_stack((numpy.concatenate(xs),
+                                   numpy.concatenate(ys)))
+
     def easy_path(self,start,goal):
         """ First we try to create an easy path if we can.
 
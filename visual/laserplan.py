@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Ordering and point budgeting of the laser's frame.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "laserplan.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+from math import sqrt
+
+# installed modules
+
+# local modules
+from shared import config
+
+# local classes
+from shared import debug
+import curves
+
+# constants
+LOGFILE = config.logfile
+
+OSCPATH = config.oscpath
+FRAMERATE = config.framerate
+
+LASER_PPS = config.laser_pps
+POINTS_PER_M = 1.0/config.laser_point_spacing
+BLANK_POINTS = config.laser_blank_points
+MIN_POINTS = config.laser_min_points
+
+# how far straight runs of a path may be simplified, in m, tried in turn
+# until the frame fits the budget
+SIMPLIFY_STEPS = [0.0, 0.02, 0.05, 0.1, 0.2]
+# rounds of 2-opt after nearest neighbour
+MAX_2OPT_PASSES = 4
+
+BEGINS = {
+    OSCPATH['graph_begin_cell']: OSCPATH['graph_end_cell'],
+    OSCPATH['graph_begin_conx']: OSCPATH['graph_end_conx'],
+}
+
+# init debugging
+dbug = debug.Debug()
+
+
+def dist(p, q):
+    return sqrt((p[0] - q[0])**2 + (p[1] - q[1])**2)
+
+def is_straight(c, tol=1e-6):
+    """Are a cubic's control points on the line between its ends?"""
+    (x0, y0, x3, y3) = (c[0], c[1], c[6], c[7])
+    length = dist((x0, y0), (x3, y3))
+    if not length:
+        return True
+    for (x, y) in ((c[2], c[3]), (c[4], c[5])):
+        if abs((x3 - x0)*(y0 - y) - (x0 - x)*(y3 - y0))/length > tol:
+            return False
+    return True
+
+def straight_cubic(p, q):
+    """A straight cubic from p to q, as Line.make_arc makes them."""
+    return [p[0], p[1],
+            p[0] + (q[0] - p[0])*0.333, p[1] + (q[1] - p[1])*0.333,
+            p[0] + (q[0] - p[0])*0.666, p[1] + (q[1] - p[1])*0.666,
+            q[0], q[1]]
+
+def simplify(points, tol):
+    """Douglas-Peucker: the points of a polyline that keep it within tol."""
+    if len(points) < 3:
+        return points
+    (p, q) = (points[0], points[-1])
+    length = dist(p, q)
+    worst = 0
+    far = 0
+    for i in range(1, len(points) - 1):
+        (x, y) = points[i]
+        if length:
+            d = abs((q[0] - p[0])*(p[1] - y) - (p[0] - x)*(q[1] - p[1]))/length
+        else:
+            d = dist(p, (x, y))
+        if d > worst:
+            worst = d
+            far = i
+    if worst <= tol:
+        return [p, q]
+    return simplify(points[:far+1], tol)[:-1] + simplify(points[far:], tol)
+
+def simplify_cubics(cubics, tol):
+    """Merge runs of straight cubics that stay within tol of the originals."""
+    if not tol:
+        return cubics
+    result = []
+    run = []
+    for c in cubics + [None]:
+        if c is not None and is_straight(c) and \
+                (not run or (run[-1][6], run[-1][7]) == (c[0], c[1])):
+            run.append(c)
+            continue
+        if run:
+            points = [(run[0][0], run[0][1])] + [(r[6], r[7]) for r in run]
+            points = simplify(points, tol)
+            for i in range(len(points) - 1):
+                result.append(straight_cubic(points[i], points[i+1]))
+            run = []
+        if c is not None:
+            if is_straight(c):
+                run = [c]
+            else:
+                result.append(c)
+    return result
+
+
+class Primitive(object):
+    """Something the laser draws without blanking: a cell or a connector.
+
+    Stores the following values:
+        m_begin, m_end: the (path, args) that bracket it, or None
+        m_runs: list of [color args, list of cubics] in drawing order
+        m_other: any other messages inside it, sent after the begin
+    """
+
+    def __init__(self, begin=None):
+        self.m_begin = begin
+        self.m_end = None
+        self.m_runs = []
+        self.m_other = []
+
+    def add(self, path, args):
+        if path == OSCPATH['graph_color']:
+            self.m_runs.append([list(args), []])
+        elif path == OSCPATH['graph_cubic']:
+            if not self.m_runs:
+                self.m_runs.append([None, []])
+            self.m_runs[-1][1].append(list(args))
+        else:
+            self.m_other.append((path, args))
+
+    def cubics(self):
+        return [c for (color, cubics) in self.m_runs for c in cubics]
+
+    def start(self):
+        for (color, cubics) in self.m_runs:
+            if cubics:
+                return (cubics[0][0], cubics[0][1])
+        return None
+
+    def end(self):
+        for (color, cubics) in reversed(self.m_runs):
+            if cubics:
+                return (cubics[-1][6], cubics[-1][7])
+        return None
+
+    def reverse(self):
+        """Draw it the other way round."""
+        runs = []
+        for (color, cubics) in reversed(self.m_runs):
+            runs.append([color, [c[6:8] + c[4:6] + c[2:4] + c[0:2]
+                                 for c in reversed(cubics)]])
+        self.m_runs = runs
+
+    def length(self):
+        return float(curves.cubic_lengths(self.cubics()).sum())
+
+    def simplify(self, tol):
+        for run in self.m_runs:
+            run[1] = simplify_cubics(run[1], tol)
+
+    def messages(self, density=None):
+        msgs = []
+        if self.m_begin is not None:
+            msgs.append(self.m_begin)
+        msgs.extend(self.m_other)
+        if density is not None:
+            msgs.append((OSCPATH['graph_density'], [density]))
+        for (color, cubics) in self.m_runs:
+            if color is not None:
+                msgs.append((OSCPATH['graph_color'], color))
+            for c in cubics:
+                msgs.append((OSCPATH['graph_cubic'], c))
+        if self.m_end is not None:
+            msgs.append(self.m_end)
+        return msgs
+
+
+class LaserFrame(object):
+    """Collects a frame of laser messages, then orders and budgets them.
+
+    The cells and connectors come to us in whatever order the field's
+    dicts give them, which sends the galvos back and forth across the
+    field with blanked jumps in between. At the end of the frame we put
+    them in an order that keeps the jumps short, nearest neighbour first
+    and then 2-opt, drawing any of them backward where that helps.
+
+    Then we count the points the frame will take: POINTS_PER_M along
+    each stroke, at least MIN_POINTS a primitive, and BLANK_POINTS for
+    each jump. If that is more than the laser can draw in a frame, we
+    simplify the straight runs of the connectors, a bit more each time,
+    until it fits. If it still doesn't fit, each primitive is given its
+    share of the budget, MIN_POINTS and then in proportion to its length,
+    and told so with a /laser/set/density (points per m) before it. The
+    density goes back to POINTS_PER_M when the frames fit again.
+
+    Stores the following values:
+        m_prims: the primitives of this frame
+        m_current: the primitive being collected, or None
+        m_loose: messages outside of any primitive
+        m_last_end: where the laser finished the last frame
+        m_density: the density the laser was last told, in points per m
+    """
+
+    def __init__(self):
+        self.m_last_end = (0.0, 0.0)
+        self.m_density = POINTS_PER_M
+        self.clear()
+
+    def clear(self):
+        self.m_prims = []
+        self.m_current = None
+        self.m_loose = []
+
+    def add(self, path, args):
+        """Add a laser message to the frame."""
+        if path in BEGINS:
+            self.m_current = Primitive((path, args))
+            self.m_prims.append(self.m_current)
+        elif self.m_current is not None and \
+                path == BEGINS[self.m_current.m_begin[0]]:
+            self.m_current.m_end = (path, args)
+            self.m_current = None
+        elif self.m_current is not None:
+            self.m_current.add(path, args)
+        elif path in (OSCPATH['graph_color'], OSCPATH['graph_cubic']):
+            # geometry that isn't in a cell or connector is its own
+            if not self.m_prims or self.m_prims[-1].m_begin is not None:
+                self.m_prims.append(Primitive())
+            self.m_prims[-1].add(path, args)
+        else:
+            self.m_loose.append((path, args))
+
+    def order(self):
+        """Order the primitives to keep the blanked jumps short."""
+        todo = [prim for prim in self.m_prims if prim.start() is not None]
+        tour = []
+        pos = self.m_last_end
+        # nearest neighbour, either way round
+        while todo:
+            best = None
+            for (i, prim) in enumerate(todo):
+                d = dist(pos, prim.start())
+                if best is None or d < best[0]:
+                    best = (d, i, False)
+                d = dist(pos, prim.end())
+                if d < best[0]:
+                    best = (d, i, True)
+            (d, i, backward) = best
+            prim = todo.pop(i)
+            if backward:
+                prim.reverse()
+            tour.append(prim)
+            pos = prim.end()
+        # 2-opt: reversing a stretch of the tour reverses each one in it
+        for npass in range(MAX_2OPT_PASSES):
+            improved = False
+            for i in range(len(tour) - 1):
+                if i:
+                    before = tour[i-1].end()
+                else:
+                    before = self.m_last_end
+                for j in range(i + 1, len(tour)):
+                    old = dist(before, tour[i].start())
+                    new = dist(before, tour[j].end())
+                    if j + 1 < len(tour):
+                        after = tour[j+1].start()
+                        old += dist(tour[j].end(), after)
+                        new += dist(tour[i].start(), after)
+                    if new < old - 1e-9:
+                        stretch = tour[i:j+1]
+                        stretch.reverse()
+                        for prim in stretch:
+                            prim.reverse()
+                        tour[i:j+1] = stretch
+                        improved = True
+            if not improved:
+                break
+        if tour:
+            self.m_last_end = tour[-1].end()
+        # the ones with nothing to draw go first, it doesn't matter where
+        self.m_prims = [prim for prim in self.m_prims
+                        if prim.start() is None] + tour
+
+    def points_needed(self):
+        """Return (points for each primitive, points for the jumps)."""
+        points = [max(MIN_POINTS, prim.length()*POINTS_PER_M)
+                  for prim in self.m_prims]
+        jumps = sum(1 for prim in self.m_prims if prim.start() is not None)
+        return (points, jumps*BLANK_POINTS)
+
+    def plan(self):
+        """Order and budget the frame; return its messages in order."""
+        self.order()
+        budget = LASER_PPS/FRAMERATE
+        for tol in SIMPLIFY_STEPS:
+            for prim in self.m_prims:
+                # cells are circles, nothing straight to simplify
+                if prim.m_begin is None or \
+                        prim.m_begin[0] == OSCPATH['graph_begin_conx']:
+                    prim.simplify(tol)
+            (points, blank) = self.points_needed()
+            if sum(points) + blank <= budget:
+                break
+        densities = [POINTS_PER_M]*len(self.m_prims)
+        total = sum(points) + blank
+        if total > budget:
+            # share out what there is: MIN_POINTS each, the rest by length
+            spare = max(0, budget - blank - MIN_POINTS*len(points))
+            extra = sum(points) - MIN_POINTS*len(points)
+            for (i, prim) in enumerate(self.m_prims):
+                length = prim.length()
+                if length and extra:
+                    share = MIN_POINTS + (points[i] - MIN_POINTS)*spare/extra
+                    densities[i] = min(POINTS_PER_M, share/length)
+        if dbug.LEV & dbug.GRAPH:
+            print "LaserFrame:plan:prims:", len(self.m_prims), \
+                  "points:", int(total), "budget:", int(budget), \
+                  "simplified:", tol
+        msgs = list(self.m_loose)
+        for (prim, density) in zip(self.m_prims, densities):
+            # only tell the laser when the density changes
+            if prim.start() is None or density == self.m_density:
+                density = None
+            else:
+                self.m_density = density
+            msgs.extend(prim.messages(density))
+        self.clear()
+        return msgs
+
+
+if __name__ == "__main__":
+
+    import random
+
+    random.seed(1)
+    frame = LaserFrame()
+    k = 0.5522847498307935
+    for cell in range(30):
+        (x, y, r) = (random.uniform(-8, 8), random.uniform(0, 16), 0.4)
+        a = [(x+r,y), (x+r,y+k*r), (x+k*r,y+r), (x,y+r), (x-k*r,y+r),
+             (x-r,y+k*r), (x-r,y), (x-r,y-k*r), (x-k*r,y-r), (x,y-r),
+             (x+k*r,y-r), (x+r,y-k*r)]
+        frame.add(OSCPATH['graph_begin_cell'], [cell])
+        frame.add(OSCPATH['graph_color'], [1.0, 1.0, 1.0])
+        for (i0, i1, i2, i3) in [(0,1,2,3), (3,4,5,6), (6,7,8,9), (9,10,11,0)]:
+            frame.add(OSCPATH['graph_cubic'],
+                      list(a[i0] + a[i1] + a[i2] + a[i3]))
+        frame.add(OSCPATH['graph_end_cell'], [cell])
+    before = sum(dist(frame.m_prims[i].end(), frame.m_prims[i+1].start())
+                 for i in range(len(frame.m_prims) - 1))
+    frame.order()
+    after = sum(dist(frame.m_prims[i].end(), frame.m_prims[i+1].start())
+                for i in range(len(frame.m_prims) - 1))
+    print "blank travel: %.1f m in arrival order, %.1f m ordered" % \
+          (before, after)
+    path = [(0.0, 0.0), (1.0, 0.0), (2.0, 0.01), (3.0, 0.0), (3.0, 1.0)]
+    cubics = [straight_cubic(path[i], path[i+1]) for i in range(len(path)-1)]
+    print "cubics in a path:", len(cubics), "simplified:", \
+          len(simplify_cubics(cubics, 0.05))
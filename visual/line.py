@@ -17,11 +17,10 @@ __version__ = "0.1pre0"
 __license__ = "GNU GPL 3.0 or later"
 
 # core modules
-from itertools import chain
 from math import sqrt
 
 # installed modules
-import pyglet
+import numpy
 
 # local modules
 from shared import config
@@ -29,15 +28,17 @@ from shared import debug
 import curves
 
 # local classes
+from redraw import is_changed
 
 # constants
 LOGFILE = config.logfile
 
 LINEMODE = config.linemode
-CURVE_SEGS = config.curve_segments  # number of line segs in a curve
+CURVE_SEGS = config.curve_segments  # most points in a curve
+CURVE_TOL = config.curve_tolerance  # how close to the curve, in pixels
 
 GRAPHMODES = config.graphic_modes
-GRAPHOPTS = {'screen': 1, 'osc': 2, 'etherdream':3}
+GRAPHOPTS = {'screen': 1, 'osc': 2, 'etherdream': 4}
 
 OSCPATH = config.oscpath
 
@@ -45,6 +46,40 @@ OSCPATH = config.oscpath
 dbug = debug.Debug()
 
 
+def circle_exits(inpts, outpts, centers, radii, clamp=True):
+    """Find where segments leave circles, all at once.
+
+    Each segment runs from a point inside its circle (inpts) toward
+    another point (outpts). We solve |inpt + t*(outpt - inpt) - center| =
+    radius for the root with t > 0, which is where the segment crosses
+    the circle on its way out.
+
+    args:
+        inpts, outpts - (n x 2) arrays of the ends of the segments
+        centers - (n x 2) array, or a single point
+        radii - array of n, or a single radius
+        clamp - if True, keep the exits on the segments, so a segment that
+            is inside its circle all the way exits at outpt; if False, an
+            exit past outpt is where the line through them leaves
+    returns:
+        (n x 2) array of exit points
+    """
+    inpts = numpy.asarray(inpts, dtype=float)
+    outpts = numpy.asarray(outpts, dtype=float)
+    d = outpts - inpts
+    f = inpts - numpy.asarray(centers, dtype=float)
+    a = (d*d).sum(axis=-1)
+    b = (f*d).sum(axis=-1)
+    c = (f*f).sum(axis=-1) - numpy.asarray(radii, dtype=float)**2
+    disc = numpy.sqrt(numpy.maximum(b*b - a*c, 0))
+    # a zero-length segment exits where it is
+    moving = a > 0
+    t = numpy.where(moving, (disc - b)/numpy.where(moving, a, 1), 0)
+    if clamp:
+        t = numpy.clip(t, 0, 1)
+    return inpts + t[..., numpy.newaxis]*d
+
+
 
 class Line(object):
     """Define line object.
@@ -57,8 +92,10 @@ class Line(object):
             m_path: path from one cell0 to cell1
             m_arcpoints: the points that make up the arcs
             m_arcindex: the index to connect the above arcpoints
-            m_points: a list of points that make up the circle
+            m_points: a list of points that make up the line, all arcs together
             m_index: the index to connect the above points
+            m_rendered: the (p0, p1, r0, r1, path) the arcpoints were made for
+            m_drawn: what the screen shape was last drawn with, or None
 
         """
 
@@ -73,10 +110,11 @@ class Line(object):
         self.m_arcpoints = None
         self.m_arcindex = None
         # each arc is broken down into a list of points and indecies
-        # these are gathered into lists of lists
-        # TODO: possibly these could be melded into single dim lists
+        # these are gathered into one list of each
         self.m_points = []
         self.m_index = []
+        self.m_rendered = None
+        self.m_drawn = None
 
     def update(self, field, p0, p1, r0, r1, color, path=None):
         """Update line information."""
@@ -109,46 +147,42 @@ class Line(object):
         return square_dist < radius ** 2
 
     def find_intersect(self, inpt, outpt, center, radius):
-        # Here instead of checking whether the point is on the circle,
-        # we just see if the points have converged on each other.
-        # 1. test to end recursion
-        dist = sqrt((inpt[0] - outpt[0])**2 + (inpt[1] - outpt[1])**2)
-        #print "KILLME: dist",dist
-        if dist < .05:
+        """Find where the segment from inpt to outpt leaves a circle.
+
+        inpt should be inside the circle. This is circle_exits for a single
+        segment, worked out directly.
+        """
+        dx = outpt[0] - inpt[0]
+        dy = outpt[1] - inpt[1]
+        fx = inpt[0] - center[0]
+        fy = inpt[1] - center[1]
+        a = dx*dx + dy*dy
+        if not a:
             return inpt
-        # 2. divide the segment in half
-        midpt = self.midpoint(outpt, inpt)
-        # 3. recurse with segment that stradles the circle boundary
-        if self.in_circle(midpt, center, radius):
-            return self.find_intersect(midpt, outpt, center, radius)
-        else:
-            return self.find_intersect(inpt, midpt, center, radius)
+        b = fx*dx + fy*dy
+        c = fx*fx + fy*fy - radius*radius
+        t = min(max((sqrt(max(b*b - a*c, 0)) - b)/a, 0), 1)
+        return (inpt[0] + t*dx, inpt[1] + t*dy)
 
     def trim_ends(self, end0, end1, p0, p1, r0, r1):
-        # Remove parts of path within the radius of cell
-        # TODO: Ensure that the logic here works in every case
-        # if both ends of this line segment are inside a circle fugetaboutit
-        #print "KILLME:start:",end0,end1,
+        """Trim a segment back to the edges of the cells at either end.
+
+        Where one end of the segment is inside a cell's circle, it is moved
+        to where the segment crosses the circle. Where both ends are inside
+        the same circle, the segment is left as it is, as it always has been:
+        in 'curves' mode these are a cubic's end and control point, and
+        moving them would change the shape of the curve.
+        """
         if (self.in_circle(end0, p0, r0) and self.in_circle(end1, p0, r0)) or\
             (self.in_circle(end0, p1, r1) and self.in_circle(end1, p1, r1)):
             return (end0, end1)
-        # if near end of this line segment is inside first circle
-        if self.in_circle(end0, p0, r0):
-            # find the point intersecting circle
-            end0 = self.find_intersect(end0, end1, p0, r0)
-        # if far end of this line segment is inside first circle
-        if self.in_circle(end1, p0, r0):
-            # find the point intersecting the circle
-            end0 = self.find_intersect(end1, end0, p0, r0)
-        # if near end of this line segment is inside second circle
-        elif self.in_circle(end0, p1, r1):
-            # find the point intersecting the circle
-            end1 = self.find_intersect(end0, end1, p1, r1)
-        # if near end of this line segment is inside second circle
-        elif self.in_circle(end1, p1, r1):
-            # find the point intersecting the circle
-            end1 = self.find_intersect(end1, end0, p1, r1)
-        #print "end:",end0,end1
+        for (center, radius) in ((p0, r0), (p1, r1)):
+            in0 = self.in_circle(end0, center, radius)
+            in1 = self.in_circle(end1, center, radius)
+            if in0:
+                end0 = self.find_intersect(end0, end1, center, radius)
+            elif in1:
+                end1 = self.find_intersect(end1, end0, center, radius)
         return (end0, end1)
 
     def render(self):
@@ -239,29 +273,35 @@ class Line(object):
             pass
 
         elif LINEMODE == 'pathfinding':
-            #n = len(path) - 1
-            for i in range(0, len(self.m_path)-1):
-                thispt = self.m_path[i]
-                nextpt = self.m_path[i+1]
-                # Remove parts of path within the radius of cell
-                # TODO: Ensure that the logic here works in every case
-                # if both ends of this line segment are inside a circle fugetaboutit
-                if (self.in_circle(thispt, p0, r0) and self.in_circle(nextpt, p0, r0)) or\
-                    (self.in_circle(thispt, p1, r1) and self.in_circle(nextpt, p1, r1)):
-                    continue
-                # if near end of this line segment is inside a circle
-                if self.in_circle(thispt, p0, r0):
-                    # find the point intersecting the circle
-                    thispt = self.find_intersect(thispt, nextpt, p0, r0)
-                # if far end of this line segment is inside the other circle
-                elif self.in_circle(nextpt, p1, r1):
-                    # find the point intersecting the circle
-                    nextpt = self.find_intersect(nextpt, thispt, p1, r1)
-
-                # if neither point is inside one of our circles, use it
-                #print path[i],"inside cell"
+            # Remove parts of path within the radius of cell, working on
+            # all the segments of the path at once
+            path = numpy.asarray(self.m_path, dtype=float)
+            if len(path) < 2:
+                return
+            thispts = path[:-1]
+            nextpts = path[1:]
+            this_in0 = ((thispts - p0)**2).sum(axis=1) < r0**2
+            next_in0 = ((nextpts - p0)**2).sum(axis=1) < r0**2
+            this_in1 = ((thispts - p1)**2).sum(axis=1) < r1**2
+            next_in1 = ((nextpts - p1)**2).sum(axis=1) < r1**2
+            # if both ends of a segment are inside a circle fugetaboutit
+            keep = ~((this_in0 & next_in0) | (this_in1 & next_in1))
+            if not keep.any():
+                return
+            # if near end of a segment is inside a circle, move it to
+            # where the segment leaves it
+            trimmed = numpy.where(this_in0[:, numpy.newaxis],
+                                  circle_exits(thispts, nextpts, p0, r0),
+                                  thispts)
+            # if far end of a segment is inside the other circle, likewise
+            nextpts = numpy.where((next_in1 & ~this_in0)[:, numpy.newaxis],
+                                  circle_exits(nextpts, thispts, p1, r1),
+                                  nextpts)
+            thispts = trimmed
+            for (thispt, nextpt) in zip(thispts[keep].tolist(),
+                                        nextpts[keep].tolist()):
                 # take segment of two points, and transform to three point arc
-                arc = self.make_arc(thispt,nextpt)
+                arc = self.make_arc(tuple(thispt), tuple(nextpt))
                 npath.append(arc[0])
                 npath.append(arc[1])
                 npath.append(arc[2])
@@ -274,6 +314,41 @@ class Line(object):
         elif LINEMODE == 'improved_pathfinding':
             pass
 
+    def draw_screen(self, renderer):
+        """Hand the line, divided into line segments, to the renderer."""
+        self.m_points = []
+        self.m_index = []
+        # for each arc in the circle, convert to line segments
+        if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_arcpoints = ",self.m_arcpoints
+        if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_arcindex = ",self.m_arcindex
+        # the tolerance in m, so we needn't scale the arcs to find the steps
+        tolerance = CURVE_TOL/self.m_field.m_screen_scale
+        for i in range(len(self.m_arcindex)):
+            # e.g., self.m_arcindex[i] = (0,1,2,3)
+            p0 = self.m_arcpoints[self.m_arcindex[i][0]]
+            p1 = self.m_arcpoints[self.m_arcindex[i][1]]
+            p2 = self.m_arcpoints[self.m_arcindex[i][2]]
+            p3 = self.m_arcpoints[self.m_arcindex[i][3]]
+            # if this is a straight line, don't chop into cubicSplines
+            #TODO: Replace with colinear test
+            if p0[0] == p1[0] == p2[0] == p3[0] or \
+                    p0[1] == p1[1] == p2[1] == p3[1]:
+                points = [p0,p3]
+                index = [0,1]
+            else:
+                nsteps = curves.cubic_steps(p0,p1,p2,p3,tolerance,CURVE_SEGS)
+                (points,index) = curves.cubic_spline(p0,p1,p2,p3,nsteps)
+            # gather the arcs into one list of points
+            first = len(self.m_points)
+            self.m_points.extend(points)
+            self.m_index.extend([first + j for j in index])
+        if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_points =",self.m_points
+        if dbug.LEV & dbug.GRAPH: print "Graph:draw:index:",self.m_index
+        scaled_pts = self.m_field.rescale_array2screen(self.m_points)
+        if dbug.LEV & dbug.GRAPH: print "Graph:draw:screen:scaled_points =",scaled_pts
+        # hand the whole line to the renderer's batch
+        renderer.lines(self, scaled_pts, self.m_index, self.m_color)
+
     def draw(self):
         """Draw a line, which is actually a path made up of cubicsplines.
 
@@ -287,7 +362,12 @@ class Line(object):
         The laser engine wants these arcs divied up into OSC messages
         """
         if self.m_p0 and self.m_p1:
-            self.render()
+            # the arcs only need working out again if something has moved
+            inputs = (self.m_p0, self.m_p1, self.m_r0, self.m_r1, self.m_path)
+            if is_changed(self.m_rendered, inputs):
+                self.render()
+                self.m_rendered = inputs
+                self.m_drawn = None
         if self.m_field and self.m_arcpoints and self.m_arcindex and self.m_color:
             if GRAPHMODES & GRAPHOPTS['screen']:
                 # The screen engine, pyglet, wants output in this form
@@ -295,41 +375,12 @@ class Line(object):
                 #       points = [(10.0,10.0), (20.0,0), (-10.0,10.0), etc]
                 #   an index into points describing contiguous line segments
                 #       index = [(1,2), (2, 3), (3,4), etc]
-                # for each arc in the circle, convert to line segments
-                if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_arcpoints = ",self.m_arcpoints
-                if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_arcindex = ",self.m_arcindex
-                for i in range(len(self.m_arcindex)):
-                    # e.g., self.m_arcindex[i] = (0,1,2,3)
-                    p0 = self.m_arcpoints[self.m_arcindex[i][0]]
-                    p1 = self.m_arcpoints[self.m_arcindex[i][1]]
-                    p2 = self.m_arcpoints[self.m_arcindex[i][2]]
-                    p3 = self.m_arcpoints[self.m_arcindex[i][3]]
-                    # if this is a straight line, don't chop into cubicSplines
-                    #TODO: Replace with colinear test
-                    if p0[0] == p1[0] == p2[0] == p3[0] or \
-                            p0[1] == p1[1] == p2[1] == p3[1]:
-                        points = [p0,p1,p2,p3]
-                        index = [0,1,1,2,2,3]
-                        # TODO: convert CURVE_SEGS into a passable parameter, so in the
-                        # case of a straight line, we pass t=1 so it makes ONE slice
-                    else:
-                        (points,index) = curves.cubic_spline(p0,p1,p2,p3,CURVE_SEGS)
-                    self.m_points.append(points)
-                    self.m_index.append(index)
-                if dbug.LEV & dbug.GRAPH: print "Graph:draw:self.m_points =",self.m_points
-                if dbug.LEV & dbug.GRAPH: print "Graph:draw:index:",self.m_index
-                # now, for each segment, output a line to pyglet
-                for i in range(len(self.m_index)):
-                    points = self.m_points[i]
-                    if dbug.LEV & dbug.GRAPH: print "Graph:draw:points =",points
-                    scaled_pts = self.m_field.rescale_pt2screen(points)
-                    if dbug.LEV & dbug.GRAPH: print "Graph:draw:screen:scaled_points =",scaled_pts
-                    index = self.m_index[i]
-                    pyglet.gl.glColor3f(self.m_color[0],self.m_color[1],self.m_color[2])
-                    pyglet.graphics.draw_indexed(len(scaled_pts), pyglet.gl.GL_LINES,
-                        index,
-                        ('v2i',tuple(chain(*scaled_pts))),
-                    )
+                # if nothing has changed, the renderer still has it
+                renderer = self.m_field.m_screen.m_renderer
+                drawn = (self.m_color, self.m_field.m_transform_version)
+                if self.m_drawn != drawn or not renderer.keep(self):
+                    self.draw_screen(renderer)
+                    self.m_drawn = drawn
             if GRAPHMODES & GRAPHOPTS['osc']:
                 # the laser engine wants output of this form:
                 #   /laser/bezier/cubic ffffffff
@@ -354,3 +405,9 @@ class Line(object):
                     self.m_field.m_osc.send_laser(OSCPATH['graph_cubic'],
                                     [p0[0], p0[1], p1[0], p1[1],
                                      p2[0], p2[1], p3[0], p3[1]])
+            if GRAPHMODES & GRAPHOPTS['etherdream']:
+                # the point stream wants the arcs as control points, and
+                # samples them itself
+                self.m_field.m_stream.add_stroke(self.m_color,
+                        [[self.m_arcpoints[j] for j in arc]
+                         for arc in self.m_arcindex])
@@ -24,7 +24,6 @@ import logging
 from time import time,sleep
 
 # installed modules
-import pyglet
 
 # local modules
 sys.path.append('..')     # Add path to find shared
@@ -40,9 +39,15 @@ LOGFILE = config.logfile
 FRAMERATE = config.framerate
 
 GRAPHMODES = config.graphic_modes
-GRAPHOPTS = {'screen': 1, 'osc': 2, 'etherdream':3}
+GRAPHOPTS = {'screen': 1, 'osc': 2, 'etherdream': 4}
+
+# without a screen we run headless, and don't need pyglet at all
+HEADLESS = not GRAPHMODES & GRAPHOPTS['screen']
+if not HEADLESS:
+    import pyglet
 
 OSCPATH = config.oscpath
+REPORT_FREQ = config.report_frequency
 
 XMIN_FIELD = config.xmin_field
 YMIN_FIELD = config.ymin_field
@@ -81,21 +86,27 @@ def main():
     # initialize field
     field = MyField()
     # initialize pyglet 
-    field.init_screen()
+    if not HEADLESS:
+        field.init_screen()
 
     osc = MyOSCHandler(field)
     field.update(osc=osc)
 
     keep_running = True
     lastframe = None
+    # for reporting how fast we draw
+    draws = 0
+    reporttime = time()
     while keep_running:
         # call user script
         osc.each_frame()
-        pyglet.clock.tick()
-        for window in pyglet.app.windows:
-            pass
-        window.switch_to()
-        window.dispatch_events()
+        field.read_state_channel()
+        if not HEADLESS:
+            pyglet.clock.tick()
+            for window in pyglet.app.windows:
+                pass
+            window.switch_to()
+            window.dispatch_events()
 
         if field.m_frame != lastframe or \
                 time() - lasttime > 1:
@@ -103,9 +114,10 @@ def main():
             #field.render_all()
             field.check_for_abandoned_cells()
             field.draw_all()
-            window.dispatch_event('on_draw')
-            #window.clear()
-            window.flip()
+            if not HEADLESS:
+                window.dispatch_event('on_draw')
+                #window.clear()
+                window.flip()
 
             #TODO: Move this somewhere sensible
             if GRAPHMODES & GRAPHOPTS['osc']:
@@ -116,6 +128,12 @@ def main():
 
             lastframe=field.m_frame
             lasttime = time()
+            draws += 1
+            if draws%REPORT_FREQ['debug'] == 0:
+                if dbug.LEV & dbug.MORE:
+                    print "Main:draws per second:", \
+                        REPORT_FREQ['debug']/(lasttime - reporttime)
+                reporttime = lasttime
         else:
             # Still on the same frame, sleep for a fraction of the frame time to not hog CPU
             #field.m_osc.send_laser('/laser/sleep',[field.m_frame])    # Useful for debugging -- can see in OSC stream when this process was sleeping
@@ -125,6 +143,8 @@ def main():
 
 
     osc.m_oscserver.close()
+    if field.m_stream is not None:
+        field.m_stream.close()
 
 if __name__ == '__main__':
     #try:
@@ -22,16 +22,20 @@ __license__ = "GNU GPL 3.0 or later"
 from math import sqrt
 
 # installed modules
+import numpy
 
 # local modules
 from shared import config
 from shared import debug
 
 # local classes
-from window import Window
 from gridmap import GridMap
 from pathfinder import PathFinder
+from dstarlite import DStarLite
+from pathpool import PathPool
+from pointstream import PointStream, make_sink
 from shared.field import Field
+from shared.statechannel import StateChannel
 from myconnector import MyConnector
 
 # constants
@@ -44,10 +48,12 @@ from myconnector import MyConnector
 # with this
 #    if GRAPHMODES & GRAPHOPTS['screen']:
 GRAPHMODES = config.graphic_modes
-GRAPHOPTS = {'screen': 1, 'osc': 2, 'etherdream':3}
+GRAPHOPTS = {'screen': 1, 'osc': 2, 'etherdream': 4}
 
 LOGFILE = config.logfile
 
+STATE_CHANNEL = config.state_channel
+
 DEF_DIAM = config.default_diam
 DEF_LINECOLOR = config.default_linecolor
 DEF_BODYCOLOR = config.default_bodycolor
@@ -72,6 +78,10 @@ YMAX_SCREEN = config.ymax_screen
 DEF_MARGIN = config.default_margin
 PATH_UNIT = config.path_unit
 BLOCK_FUZZ = config.fuzzy_area_for_cells
+LINEMODE = config.linemode
+PATHFINDING_MODES = ['pathfinding', 'improved_pathfinding']
+PATH_PLANNER = config.path_planner
+PATH_WORKERS = config.path_workers
 
 # init debugging
 dbug = debug.Debug()
@@ -105,10 +115,30 @@ class MyField(Field):
         # our default margins, one will be overwriten below
         self.m_xmargin = int(self.m_xmax_screen*DEF_MARGIN)
         self.m_ymargin = int(self.m_ymax_screen*DEF_MARGIN)
+        # bumped each time the transforms change, so shapes know to redraw
+        self.m_transform_version = 0
         self.set_scaling()
         self.m_screen = object
         self.m_pathgrid = object
         self.m_pathfinder = object
+        # paths found last frame and this frame, indexed by cid, as
+        # (start, goal, path, tiles, version)
+        self.m_path_cache = {}
+        self.m_last_path_cache = {}
+        # incremental planners for the connectors, indexed by cid
+        self.m_planners = {}
+        self.m_last_planners = {}
+        # pool of processes to plan the paths in, if we have one
+        self.m_path_pool = None
+        # points straight to the laser, if we're doing that
+        self.m_stream = None
+        if GRAPHMODES & GRAPHOPTS['etherdream']:
+            self.m_stream = PointStream(self, make_sink())
+        # same-host shared-memory state channel from the conductor
+        self.m_state_channel = None
+        self.m_state_conxs = {}
+        if STATE_CHANNEL:
+            self.m_state_channel = StateChannel()
         super(MyField, self).__init__()
         self.make_path_grid()
 
@@ -120,6 +150,8 @@ class MyField(Field):
         width = self.m_xmax_screen - self.m_xmin_screen
         height = self.m_ymax_screen - self.m_ymin_screen
         if dbug.LEV & dbug.FIELD: print "field:init_screen"
+        # only imported here, so that without a screen we don't need pyglet
+        from window import Window
         self.m_screen = Window(self,width=width,height=height)
         # set window background color = r, g, b, alpha
         # each value goes from 0.0 to 1.0
@@ -133,6 +165,34 @@ class MyField(Field):
         self.m_screen.set_minimum_size(XMAX_SCREEN/4, YMAX_SCREEN/4)
         self.m_screen.set_visible()
 
+    # State channel
+
+    def read_state_channel(self):
+        """Update from the latest conductor snapshot, if there's a new one.
+
+        This does the same as the conductor's rollcall and conx messages.
+        Connector attrs that have gone since the last snapshot are zeroed,
+        as the conductor does over OSC when it removes them. Cell attrs are
+        in the snapshot too, but are ignored, as /conductor/attr is.
+        """
+        if self.m_state_channel is None:
+            return
+        state = self.m_state_channel.read()
+        if state is None:
+            return
+        (frame, cells, attrs, conxs) = state
+        for (uid, visible) in cells:
+            self.update_cell(uid, visible=bool(visible))
+        state_conxs = {}
+        for (uid0, uid1, type, value) in conxs:
+            cid = self.get_cid(uid0, uid1)
+            state_conxs[(cid, type)] = (uid0, uid1)
+            self.update_conx_attr(cid, uid0, uid1, type, value)
+        for (cid, type), (uid0, uid1) in self.m_state_conxs.iteritems():
+            if (cid, type) not in state_conxs and cid in self.m_conx_dict:
+                self.update_conx_attr(cid, uid0, uid1, type, 0.0)
+        self.m_state_conxs = state_conxs
+
     # Scaling
 
     def set_scaling(self,pmin_field=None,pmax_field=None,pmin_vector=None,pmax_vector=None,
@@ -234,10 +294,47 @@ class MyField(Field):
                                                           (xmax_screen,ymax_screen)
             #print "Screen scale:",self.m_screen_scale
             #print "Screen margins:",(self.m_xmargin,self.m_ymargin)
+        else:
+            # no screen to fit, so the field fills the vector space
+            vector_aspect = float(xmax_vector-xmin_vector)/(ymax_vector-ymin_vector)
+            if field_aspect > vector_aspect:
+                field_xlen=xmax_field-xmin_field
+                if field_xlen:
+                    self.m_vector_scale = \
+                        float(xmax_vector-xmin_vector)/field_xlen
+            else:
+                field_ylen=ymax_field-ymin_field
+                if field_ylen:
+                    self.m_vector_scale = \
+                        float(ymax_vector-ymin_vector)/field_ylen
+        self.set_transforms()
+        if GRAPHMODES & GRAPHOPTS['screen']:
             if dbug.LEV & dbug.MORE: print "Used screen space:",\
                         self.rescale_pt2screen((xmin_field,ymin_field)),\
                         self.rescale_pt2screen((xmax_field,ymax_field))
 
+    def set_transforms(self):
+        """Work out the transforms from the field to each space.
+
+        Each one takes a point p to (p - orig_min)*scale + new_min, and is
+        stored as (orig_xmin, orig_ymin, scale, new_xmin, new_ymin, integral),
+        where integral spaces (screen and path) truncate the scaled offset
+        to ints before adding new_min, as they always have.
+        """
+        xmin_field = self.m_xmin_field
+        ymin_field = self.m_ymin_field
+        self.m_transform_version += 1
+        self.m_transforms = {
+            'screen': (xmin_field, ymin_field, self.m_screen_scale,
+                       self.m_xmin_screen+self.m_xmargin,
+                       self.m_ymin_screen+self.m_ymargin, True),
+            'vector': (xmin_field, ymin_field, self.m_vector_scale,
+                       self.m_xmin_vector, self.m_ymin_vector, False),
+            'path': (xmin_field, ymin_field, self.m_path_scale, 0, 0, True),
+            'path2pt': (0.0, 0.0, 1.0/self.m_path_scale,
+                        xmin_field, ymin_field, False),
+        }
+
     # Everything
 
     #CHANGE: incorporated into draw
@@ -249,11 +346,19 @@ class MyField(Field):
 
     def draw_all(self):
         """Draw all the cells and connectors."""
-        self.m_screen.draw_guides()
+        if GRAPHMODES & GRAPHOPTS['screen']:
+            self.m_screen.m_renderer.begin_frame()
+            self.m_screen.draw_guides()
+        if self.m_stream is not None:
+            self.m_stream.begin_frame()
         self.draw_all_cells()
         self.calc_all_paths()
         self.draw_all_connectors()
         self.draw_all_groups()
+        if GRAPHMODES & GRAPHOPTS['screen']:
+            self.m_screen.m_renderer.end_frame()
+        if self.m_stream is not None:
+            self.m_stream.end_frame()
 
     #CHANGE: incorporated into draw
     #def render_cell(self,cell):
@@ -370,6 +475,12 @@ class MyField(Field):
                                 self.m_pathgrid.successors, 
                                 self.m_pathgrid.move_cost, 
                                 self.m_pathgrid.estimate)
+        # the incremental planner keeps its searches here, so it can't
+        # be farmed out
+        if PATH_WORKERS and LINEMODE in PATHFINDING_MODES and \
+                PATH_PLANNER != 'dstarlite':
+            self.m_path_pool = PathPool(PATH_WORKERS, self.m_pathgrid.xmax,
+                                        self.m_pathgrid.ymax)
 
     def reset_path_grid(self):
         self.m_pathgrid.reset_grid()
@@ -395,6 +506,11 @@ class MyField(Field):
         """
         #conx_dict_rekeyed = self.m_conx_dict
         #for i in conx_dict_rekeyed.iterkeys():
+        self.m_pathgrid.finish_blocks()
+        self.m_last_path_cache = self.m_path_cache
+        self.m_path_cache = {}
+        self.m_last_planners = self.m_planners
+        self.m_planners = {}
         conx_dict_rekeyed = {}
         for connector in self.m_conx_dict.values():
             if self.is_conx_good_to_go(connector.m_id):
@@ -405,30 +521,141 @@ class MyField(Field):
                 # here we save time by reindexing as we go through it
                 connector.update(dist=dist)
                 conx_dict_rekeyed[dist] = connector
-        for i in sorted(conx_dict_rekeyed.iterkeys()):
-            connector = conx_dict_rekeyed[i]
+        connectors = [conx_dict_rekeyed[i]
+                      for i in sorted(conx_dict_rekeyed.iterkeys())]
+        if LINEMODE not in PATHFINDING_MODES:
+            # easy paths don't depend on each other, so we do them together
+            self.find_easy_paths(connectors)
+            return
+        if self.m_path_pool is not None:
+            self.find_paths_pooled(connectors)
+            return
+        for connector in connectors:
             #print "findpath--id:",connector.m_id,"dist:",i**0.5
             path = self.find_path(connector)
             connector.add_path(path)
             #import pdb;pdb.set_trace()
 
+    def find_easy_paths(self, connectors):
+        """ Find easy paths for a list of connectors and add them.
+
+        The paths are made as arrays, blocked on the map together, and
+        rescaled together.
+        """
+        paths = []
+        for connector in connectors:
+            start = self.rescale_pt2path((connector.m_cell0.m_x, connector.m_cell0.m_y))
+            goal = self.rescale_pt2path((connector.m_cell1.m_x, connector.m_cell1.m_y))
+            paths.append(self.m_pathgrid.easy_path_array(start, goal))
+        if not paths:
+            return
+        self.m_pathgrid.set_block_lines(paths)
+        points = self.rescale_path2pt(numpy.concatenate(paths))
+        lengths = [len(path) for path in paths]
+        first = 0
+        for connector, length in zip(connectors, lengths):
+            connector.add_path(points[first:first+length])
+            first += length
+
     def find_path(self, connector):
-        """ Find path in path_grid and then scale it appropriately."""
+        """ Find path in path_grid and then scale it appropriately.
+        
+        The path from last frame is reused if neither end has moved to
+        another square and no obstacle has changed along it.
+        """
+        (start, goal) = self.path_ends(connector)
+        path = self.cached_path(connector, start, goal)
+        if path is None:
+            path = self.plan_path(connector, start, goal)
+        return self.keep_path(connector, start, goal, path)
+
+    def path_ends(self, connector):
+        """ Return the path-scaled (start, goal) of a connector. """
         start = self.rescale_pt2path((connector.m_cell0.m_x, connector.m_cell0.m_y))
         goal = self.rescale_pt2path((connector.m_cell1.m_x, connector.m_cell1.m_y))
+        return (start, goal)
+
+    def cached_path(self, connector, start, goal):
+        """ Return last frame's path if it is still good, or None. """
+        cached = self.m_last_path_cache.get(connector.m_id)
+        if cached:
+            (cstart, cgoal, cpath, tiles, version) = cached
+            if cstart == start and cgoal == goal and \
+                    self.m_pathgrid.is_path_current(tiles, version):
+                return cpath
+        return None
+
+    def plan_path(self, connector, start, goal):
+        """ Plan a path with our planner, falling back to an easy path. """
         # TODO: Either here or in compute_path we first try several simple/dumb
         # paths, reserving A* for the ones that are blocked and need more
         # smarts. We sort the connectors by distance and do easy paths for the
         # closest ones first.
-        path = list(self.m_pathgrid.easy_path(start, goal))
+        path = []
+        if LINEMODE in PATHFINDING_MODES:
+            if PATH_PLANNER == 'dstarlite':
+                planner = self.m_last_planners.get(connector.m_id)
+                if planner is None:
+                    planner = DStarLite(self.m_pathgrid)
+                self.m_planners[connector.m_id] = planner
+                path = planner.plan(start, goal)
+            elif PATH_PLANNER == 'hierarchical':
+                path = self.m_pathgrid.hier_path(start, goal)
+            else:
+                path = self.m_pathgrid.grid_path(start, goal)
+        if not path:
+            path = list(self.m_pathgrid.easy_path(start, goal))
         #if not path:
         #path = list(self.m_pathfinder.compute_path(start, goal))
+        return path
+
+    def keep_path(self, connector, start, goal, path):
+        """ Block a path on the map, cache it, and return it scaled. """
         # take results of found paths and block them on the map
         self.m_pathgrid.set_block_line(path)
+        self.m_path_cache[connector.m_id] = (start, goal, path,
+                                             self.m_pathgrid.path_tiles(path),
+                                             self.m_pathgrid.version)
+        # hang on to the connector's planner, even if it wasn't needed
+        planner = self.m_last_planners.get(connector.m_id)
+        if planner is not None:
+            self.m_planners.setdefault(connector.m_id, planner)
         #self.allpaths = self.allpaths + path
         rescaled_path = self.rescale_path2pt(path)
         #import pdb;pdb.set_trace()
         return rescaled_path
+
+    def find_paths_pooled(self, connectors):
+        """ Find paths for the connectors across the path pool.
+
+        The connectors without a good cached path are planned all at once
+        against the obstacles alone. Then, going through them shortest
+        first as find_path would, we lay each path down, but re-plan it
+        here first if it crosses a line laid down before it. Lines only
+        ever add cost, so a path that crosses none of them is still the
+        one find_path would have found.
+        """
+        ends = [self.path_ends(connector) for connector in connectors]
+        paths = [self.cached_path(connector, start, goal)
+                 for (connector, (start, goal)) in zip(connectors, ends)]
+        todo = [i for (i, path) in enumerate(paths) if path is None]
+        planned = self.m_path_pool.plan_paths(
+                self.m_pathgrid, [ends[i] for i in todo], PATH_PLANNER)
+        for (i, path) in zip(todo, planned):
+            paths[i] = path
+        todo = set(todo)
+        replanned = 0
+        for (i, connector) in enumerate(connectors):
+            (start, goal) = ends[i]
+            path = paths[i]
+            if i in todo and (not path or
+                              self.m_pathgrid.crosses_line(path)):
+                path = self.plan_path(connector, start, goal)
+                replanned += 1
+            connector.add_path(self.keep_path(connector, start, goal, path))
+        if dbug.LEV & dbug.FIELD & dbug.MORE:
+            print "Field:find_paths_pooled:planned:", len(todo), \
+                  "replanned:", replanned
         
     def print_grid(self):
         self.m_pathgrid.printme()
@@ -511,33 +738,81 @@ class MyField(Field):
             print "ERROR: Can only rescale a point, not",obj
             return obj
 
+    def transform_array(self, points, space):
+        """Transform an (n, 2) array of points into one of our spaces.
+
+        args:
+            points - (n, 2) array (or anything numpy can make one of)
+            space - 'screen', 'vector', 'path' or 'path2pt'
+        returns:
+            (n, 2) array, of ints for the screen and path spaces
+        """
+        (ox, oy, scale, nx, ny, integral) = self.m_transforms[space]
+        out = (numpy.asarray(points, dtype=float) -
+               numpy.array((ox, oy)))*scale
+        if integral:
+            return numpy.trunc(out).astype(int) + numpy.array((nx, ny))
+        return out + numpy.array((nx, ny))
+
+    def rescale_array2screen(self, points):
+        """Convert an (n, 2) array from internal units to screen units. """
+        return self.transform_array(points, 'screen')
+
+    def rescale_array2vector(self, points):
+        """Convert an (n, 2) array from internal units to vector units. """
+        return self.transform_array(points, 'vector')
+
+    def rescale_array2path(self, points):
+        """Convert an (n, 2) array from internal units to path units. """
+        return self.transform_array(points, 'path')
+
+    def rescale_path2array(self, points):
+        """Convert an (n, 2) array from path units to internal units. """
+        return self.transform_array(points, 'path2pt')
+
+    def _transform(self, p, space):
+        """Transform a point, or a list of them, into one of our spaces.
+
+        A single point is done with plain arithmetic, and a list of points
+        as an array. Anything else goes to _rescale_pts as before.
+        """
+        (ox, oy, scale, nx, ny, integral) = self.m_transforms[space]
+        if isinstance(p, tuple) and len(p) == 2 and \
+                isinstance(p[0], (int,float)) and \
+                isinstance(p[1], (int,float)):
+            if integral:
+                return (int((p[0]-ox)*scale) + nx, int((p[1]-oy)*scale) + ny)
+            return (float(p[0]-ox)*scale + nx, float(p[1]-oy)*scale + ny)
+        if isinstance(p, numpy.ndarray) or (isinstance(p, list) and p):
+            points = numpy.asarray(p)
+            if points.ndim == 2 and points.shape[1] == 2:
+                return [tuple(pt) for pt in
+                        self.transform_array(points, space).tolist()]
+        if integral:
+            type = 'int'
+        else:
+            type = 'float'
+        return self._rescale_pts(p, scale, (ox, oy), (nx, ny), type)
+
     def rescale_pt2screen(self,p):
         """Convert coord in internal units (cm) to units usable for the vector or screen. """
-        orig_pmin = (self.m_xmin_field,self.m_ymin_field)
-        scale = self.m_screen_scale
-        new_pmin = (self.m_xmin_screen+self.m_xmargin,self.m_ymin_screen+self.m_ymargin)
-        return self._rescale_pts(p,scale,orig_pmin,new_pmin, 'int')
+        return self._transform(p, 'screen')
 
     def rescale_pt2vector(self,p):
         """Convert coord in internal units (cm) to units usable for the vector or screen. """
-        orig_pmin = (self.m_xmin_field,self.m_ymin_field)
-        scale = self.m_vector_scale
-        new_pmin = (self.m_xmin_vector,self.m_ymin_vector)
-        return self._rescale_pts(p,scale,orig_pmin,new_pmin, 'float')
+        return self._transform(p, 'vector')
 
     def rescale_pt2path(self,p):
         """Convert coord in internal units (cm) to units usable for the vector or screen. """
-        orig_pmin = (self.m_xmin_field,self.m_ymin_field)
-        scale = self.m_path_scale
-        new_pmin = (0,0)
-        return self._rescale_pts(p,scale,orig_pmin,new_pmin, 'int')
+        return self._transform(p, 'path')
 
     def rescale_path2pt(self,p):
-        """Convert coord in internal units (cm) to units usable for the vector or screen. """
-        orig_pmin = (0.0,0.0)
-        scale = 1.0/self.m_path_scale
-        new_pmin = (self.m_xmin_field,self.m_ymin_field)
-        return self._rescale_pts(p, scale, orig_pmin, new_pmin, 'float')
+        """Convert coord in internal units (cm) to units usable for the vector or screen.
+
+        Also takes an (n, 2) array of path points, which it converts in one
+        go, returning a list of points.
+        """
+        return self._transform(p, 'path2pt')
 
     def rescale_num2screen(self,n):
         """Convert num in internal units (cm) to units usable for screen. """
@@ -31,6 +31,8 @@ from shared import config
 from shared import debug
 
 # local Classes
+from displaylist import DisplayList
+from laserplan import LaserFrame
 
 # configure servers & clients properly
 import socket
@@ -48,6 +50,8 @@ else:
 OSCTIMEOUT = config.osctimeout
 OSCPATH = config.oscpath
 REPORT_FREQ = config.report_frequency
+LASER_DISPLAY_LIST = config.laser_display_list
+LASER_PLAN = config.laser_plan
 
 # init debugging
 dbug = debug.Debug()
@@ -88,12 +92,68 @@ class MyOSCHandler(OSCHandler):
             'conduct_event': self.event_conduct_event,
         }
 
+        # the frame's laser output, if we're packing it
+        self.m_display_list = None
+        if LASER_DISPLAY_LIST:
+            self.m_display_list = DisplayList()
+        # the frame's laser output, if we're ordering and budgeting it
+        self.m_laser_frame = None
+        if LASER_PLAN:
+            self.m_laser_frame = LaserFrame()
+
         super(MyOSCHandler, self).__init__(osc_server, osc_clients, field)
 
     def honey_im_home(self):
         """Broadcast a hello message to the network."""
         self.send_to_all_clients(OSCPATH['visual_start'],[])
 
+    #
+    # Laser OUTGOING
+    #
+
+    def send_laser(self, path, args):
+        """Send to the laser, planning the frame first if we're doing that.
+
+        With laser_plan on, the frame is held until /laser/update, then
+        ordered and budgeted (see LaserFrame) and sent on.
+        """
+        if self.m_laser_frame is None:
+            return self.emit_laser(path, args)
+        if path == OSCPATH['graph_update']:
+            for (planpath, planargs) in self.m_laser_frame.plan():
+                self.emit_laser(planpath, planargs)
+            self.emit_laser(path, args)
+        else:
+            self.m_laser_frame.add(path, args)
+
+    def emit_laser(self, path, args):
+        """Send to the laser, or add to the display list if we have one.
+
+        The display list goes at the end of the frame, in place of
+        /laser/update. Laser messages it can't pack are sent as they come.
+        """
+        if self.m_display_list is None:
+            return super(MyOSCHandler, self).send_laser(path, args)
+        if path == OSCPATH['graph_update']:
+            self.send_display_list(args[0])
+        elif not self.m_display_list.add(path, args):
+            super(MyOSCHandler, self).send_laser(path, args)
+
+    def send_display_list(self, frame):
+        """Send the frame's display list to the laser and recorder.
+
+        Each part goes as /laser/displaylist [frame, part, nparts, blob].
+        """
+        parts = self.m_display_list.parts()
+        if dbug.LEV & dbug.GRAPH:
+            print "OSC:send_display_list:frame:", frame, "records:", \
+                  len(self.m_display_list.m_records), "parts:", len(parts)
+        for clientkey in ('laser', 'recorder'):
+            for (i, part) in enumerate(parts):
+                self.send_blob_to(clientkey, OSCPATH['graph_display_list'],
+                                  [frame, i, len(parts)], part)
+        self.m_display_list.clear()
+
     #
     # Conductor INCOMING
     #
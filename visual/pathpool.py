@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Parallel planning of connector paths.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "pathpool.py"
+__author__ = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+# installed modules
+import numpy
+
+# local modules
+from shared import config
+
+# local classes
+from shared import debug
+from gridmap import GridMap
+
+# constants
+LOGFILE = config.logfile
+
+# init debugging
+dbug = debug.Debug()
+
+# worker process globals, set up by _init_worker
+_grid = None
+
+
+class PathPool(object):
+    """A pool of worker processes that plan connector paths.
+
+    Once the obstacles are down for a frame, the cost map is copied into a
+    shared-memory snapshot that the workers inherit when the pool is
+    created, and the connectors are planned across the pool against it, all
+    at once. The snapshot has none of this frame's lines in it, so the
+    caller lays the paths down in order and re-plans, one after another,
+    only those that cross a line laid down before them (see
+    MyField.calc_connector_paths).
+
+    Stores the following values:
+        m_workers: number of worker processes
+        m_snapshot: shared array of the grid's costs
+        m_view: the snapshot as a numpy array shaped like the grid's map
+        m_pool: the multiprocessing pool
+
+    """
+
+    def __init__(self, workers, xmax, ymax):
+        self.m_workers = workers
+        self.m_snapshot = RawArray('B', (xmax+1)*(ymax+1))
+        self.m_view = numpy.frombuffer(self.m_snapshot, dtype=numpy.uint8).\
+                reshape((xmax+1, ymax+1))
+        self.m_pool = multiprocessing.Pool(workers, _init_worker,
+                                           (self.m_snapshot, xmax, ymax))
+
+    def close(self):
+        self.m_pool.terminate()
+        self.m_pool.join()
+
+    def plan_paths(self, grid, ends, planner):
+        """Plan a path for each of a list of ends across the pool.
+
+        args:
+            grid - the GridMap, with the obstacles (but no lines) down
+            ends - list of path-scaled (start, goal)
+            planner - 'astar' or 'hierarchical'
+        returns:
+            a path for each of the ends, [] where there was none
+        """
+        self.m_view[:] = grid.map
+        # partition the ends into shards
+        shards = [[] for i in range(self.m_workers)]
+        for i, (start, goal) in enumerate(ends):
+            shards[i % self.m_workers].append((i, start, goal))
+        tasks = [(grid.version, planner, shard) for shard in shards if shard]
+        if dbug.LEV & dbug.FIELD & dbug.MORE:
+            print "PathPool:plan_paths:paths:", len(ends), \
+                  "shards:", len(tasks)
+        # merge results back
+        paths = [[] for i in range(len(ends))]
+        for results in self.m_pool.map(_plan_shard, tasks):
+            for (i, path) in results:
+                paths[i] = path
+        return paths
+
+
+# Worker side
+
+def _init_worker(snapshot, xmax, ymax):
+    global _grid
+    _grid = GridMap(xmax, ymax)
+    # plan straight out of the snapshot; we only ever read it
+    _grid.map = numpy.frombuffer(snapshot, dtype=numpy.uint8).\
+            reshape((xmax+1, ymax+1))
+
+def _plan_shard(task):
+    """Plan a path for each (i, start, goal) of a shard; return (i, path)."""
+    (version, planner, shard) = task
+    # the snapshot only changes when the obstacles do, which is when the
+    # version does, so the coarse grid is rebuilt when it needs to be
+    _grid.version = version
+    results = []
+    for (i, start, goal) in shard:
+        if planner == 'hierarchical':
+            path = _grid.hier_path(start, goal)
+        else:
+            path = _grid.grid_path(start, goal)
+        results.append((i, path))
+    return results
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Point stream output, straight to a laser DAC or a stand-in for one.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "pointstream.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+import socket
+import struct
+import threading
+import Queue
+from math import ceil
+
+# installed modules
+import numpy
+
+# local modules
+from shared import config
+
+# local classes
+from shared import debug
+import curves
+
+# constants
+LOGFILE = config.logfile
+
+FRAMERATE = config.framerate
+LASER_PPS = config.laser_pps
+POINTS_PER_M = 1.0/config.laser_point_spacing
+BLANK_POINTS = config.laser_blank_points
+CURVE_TOL = config.laser_curve_tolerance
+STREAM_SINK = config.laser_stream_sink
+MAX_DATAGRAM = config.osc_max_datagram
+
+# what the DAC takes
+DAC_MIN = -32768
+DAC_MAX = 32767
+DAC_COLOR = 65535
+
+# a point as we keep it, and as the UDP stand-in sends it
+POINT_DTYPE = numpy.dtype([('x', '<i2'), ('y', '<i2'),
+                           ('r', '<u2'), ('g', '<u2'), ('b', '<u2')])
+# a point in an ILDA format 5 (2D true color) record
+ILDA_DTYPE = numpy.dtype([('x', '>i2'), ('y', '>i2'), ('status', 'u1'),
+                          ('b', 'u1'), ('g', 'u1'), ('r', 'u1')])
+ILDA_HEADER = struct.Struct('>4s3xB8s8sHHHBx')
+ILDA_LAST = 0x80
+ILDA_BLANK = 0x40
+UDP_HEADER = struct.Struct('<HHH')
+
+# init debugging
+dbug = debug.Debug()
+
+
+class PointStream(object):
+    """Turns each frame's curves into points and streams them to a sink.
+
+    Circles and lines give us their cubics as they're drawn, each shape
+    as one stroke. At the end of the frame the cubics are sampled
+    POINTS_PER_M along their length, or fewer if that comes to more than
+    the laser draws in a frame at LASER_PPS (but never so few that a curve
+    strays more than laser_curve_tolerance), put in DAC units through the
+    field's vector transform, and joined with BLANK_POINTS blanked points
+    from the end of one stroke to the start of the next.
+
+    The frame is then handed to a thread that writes it to the sink, so
+    the next frame is drawn while this one goes out. There are two
+    buffers: the frame going out, and the one waiting. If the sink falls
+    behind, a frame that is still waiting is replaced by the newer one
+    rather than queued up behind it.
+
+    A sink is anything with write_frame(points, frame) and close(), where
+    points is an array of POINT_DTYPE.
+
+    Stores the following values:
+        m_field: the field, for its vector transform
+        m_sink: where the frames go
+        m_strokes: list of (color, cubics) drawn this frame
+        m_frame: number of the frame
+        m_last: last point of the last frame, in DAC units
+        m_waiting: the frame waiting to go out
+        m_thread: the thread writing frames to the sink
+
+    """
+
+    def __init__(self, field, sink):
+        self.m_field = field
+        self.m_sink = sink
+        self.m_strokes = []
+        self.m_frame = 0
+        self.m_last = (0, 0)
+        self.m_waiting = Queue.Queue(maxsize=1)
+        self.m_thread = threading.Thread(target=self._output)
+        self.m_thread.daemon = True
+        self.m_thread.start()
+
+    def begin_frame(self):
+        self.m_strokes = []
+
+    def add_stroke(self, color, cubics):
+        """Add a stroke to the frame.
+
+        args:
+            color - (r, g, b), from 0 to 1
+            cubics - list of four control points for each cubic, in m
+        """
+        if cubics:
+            self.m_strokes.append((color, cubics))
+
+    def end_frame(self):
+        """Sample the frame and pass it on to be sent."""
+        points = self.sample()
+        self.m_frame += 1
+        frame = (self.m_frame, points)
+        try:
+            self.m_waiting.put_nowait(frame)
+        except Queue.Full:
+            # the sink is behind, drop the frame that didn't get sent
+            try:
+                self.m_waiting.get_nowait()
+            except Queue.Empty:
+                pass
+            self.m_waiting.put_nowait(frame)
+
+    def sample(self):
+        """Return the frame's strokes as an array of POINT_DTYPE."""
+        controls = [numpy.asarray(cubics, dtype=float)
+                    for (color, cubics) in self.m_strokes]
+        lengths = [curves.cubic_lengths(c) for c in controls]
+        density = POINTS_PER_M
+        # if the jumps alone take the frame, the strokes get only what the
+        # curve tolerance asks for
+        budget = max(0, LASER_PPS/FRAMERATE - BLANK_POINTS*len(controls))
+        total = sum(l.sum() for l in lengths)*density
+        if total > budget:
+            density *= budget/total
+        # the curve tolerance in m
+        tolerance = CURVE_TOL/float(self.m_field.m_vector_scale)
+        parts = []
+        last = self.m_last
+        for ((color, cubics), c, l) in zip(self.m_strokes, controls, lengths):
+            xy = []
+            for (cubic, length) in zip(c, l):
+                # as many as the budget gives us, but not so few that a
+                # tight curve turns into corners
+                most = max(2, int(ceil(length*POINTS_PER_M)) + 1)
+                nsteps = max(int(ceil(length*density)) + 1,
+                             curves.cubic_steps(cubic[0], cubic[1], cubic[2],
+                                                cubic[3], tolerance, most))
+                # each cubic starts where the last one ended
+                xy.append(numpy.dot(curves.cubic_basis(nsteps), cubic)[1:])
+            xy = numpy.concatenate([c[0, :1]] + xy)
+            xy = numpy.clip(self.m_field.rescale_array2vector(xy),
+                            DAC_MIN, DAC_MAX).astype(int)
+            # blanked, from where the laser is to the start of the stroke
+            t = numpy.linspace(0, 1, BLANK_POINTS)[:, numpy.newaxis]
+            blank = numpy.zeros(BLANK_POINTS, dtype=POINT_DTYPE)
+            jump = numpy.array(last)*(1 - t) + xy[0]*t
+            (blank['x'], blank['y']) = jump.astype(int).T
+            stroke = numpy.zeros(len(xy), dtype=POINT_DTYPE)
+            (stroke['x'], stroke['y']) = xy.T
+            (stroke['r'], stroke['g'], stroke['b']) = \
+                [int(min(1.0, max(0.0, v))*DAC_COLOR) for v in color[:3]]
+            parts.extend([blank, stroke])
+            last = tuple(xy[-1])
+        self.m_last = last
+        if not parts:
+            # nothing to draw, park the laser where it is, blanked
+            park = numpy.zeros(1, dtype=POINT_DTYPE)
+            (park['x'], park['y']) = last
+            parts.append(park)
+        points = numpy.concatenate(parts)
+        if dbug.LEV & dbug.GRAPH:
+            print "PointStream:sample:strokes:", len(self.m_strokes), \
+                  "points:", len(points)
+        return points
+
+    def _output(self):
+        while True:
+            (frame, points) = self.m_waiting.get()
+            if points is None:
+                break
+            # whatever goes wrong with a frame, keep on with the next, so
+            # the thread is still here to stop when we close
+            try:
+                self.m_sink.write_frame(points, frame)
+            except Exception as e:
+                if dbug.LEV & dbug.MSGS:
+                    print "PointStream:output:Unable to write frame", \
+                          frame, e
+
+    def close(self):
+        """Send what's waiting, then close the sink.
+
+        If the sink is stuck, we give it a second and close anyway.
+        """
+        try:
+            self.m_waiting.put((None, None), timeout=1.0)
+        except Queue.Full:
+            pass
+        self.m_thread.join(1.0)
+        self.m_sink.close()
+
+
+class ILDAFileSink(object):
+    """Writes the frames to an ILDA file, format 5 (2D true color).
+
+    Stores the following values:
+        m_file: the file we're writing
+        m_count: frames written
+    """
+
+    def __init__(self, filename):
+        self.m_file = open(filename, 'wb')
+        self.m_count = 0
+
+    def header(self, npoints, frame):
+        return ILDA_HEADER.pack('ILDA', 5, 'crs'.ljust(8, '\0'),
+                                'modes.io'.ljust(8, '\0'), npoints,
+                                frame & 0xffff, 0, 0)
+
+    def write_frame(self, points, frame):
+        # an ILDA frame holds at most 65535 points
+        points = points[:0xffff]
+        ilda = numpy.zeros(len(points), dtype=ILDA_DTYPE)
+        ilda['x'] = points['x']
+        ilda['y'] = points['y']
+        ilda['r'] = points['r'] >> 8
+        ilda['g'] = points['g'] >> 8
+        ilda['b'] = points['b'] >> 8
+        dark = (points['r'] == 0) & (points['g'] == 0) & (points['b'] == 0)
+        ilda['status'][dark] = ILDA_BLANK
+        ilda['status'][-1] |= ILDA_LAST
+        self.m_file.write(self.header(len(ilda), self.m_count))
+        self.m_file.write(ilda.tostring())
+        self.m_count += 1
+
+    def close(self):
+        # a header with no points ends the file
+        self.m_file.write(self.header(0, self.m_count))
+        self.m_file.close()
+
+
+class UDPSink(object):
+    """Sends the frames as UDP datagrams, standing in for a DAC.
+
+    Each datagram is a header of (frame, part, nparts), unsigned shorts,
+    then as many points of POINT_DTYPE as fit in osc_max_datagram.
+
+    Stores the following values:
+        m_socket: our socket
+        m_addr: (host, port) to send to
+    """
+
+    def __init__(self, host, port):
+        self.m_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.m_addr = (host, port)
+
+    def write_frame(self, points, frame):
+        per_part = (MAX_DATAGRAM - UDP_HEADER.size)/POINT_DTYPE.itemsize
+        nparts = max(1, int(ceil(len(points)/float(per_part))))
+        for part in range(nparts):
+            chunk = points[part*per_part:(part+1)*per_part]
+            self.m_socket.sendto(UDP_HEADER.pack(frame & 0xffff, part, nparts)
+                                 + chunk.tostring(), self.m_addr)
+
+    def close(self):
+        self.m_socket.close()
+
+
+def make_sink(spec=STREAM_SINK):
+    """Make a sink from its description in config.laser_stream_sink.
+
+    Either 'ilda:<filename>' or 'udp:<host>:<port>'.
+    """
+    (kind, sep, where) = spec.partition(':')
+    if kind == 'ilda':
+        return ILDAFileSink(where)
+    if kind == 'udp':
+        (host, sep, port) = where.rpartition(':')
+        return UDPSink(host, int(port))
+    raise ValueError("Unknown laser stream sink: %s" % spec)
+
+
+if __name__ == "__main__":
+
+    import os
+    import tempfile
+
+    class Field(object):
+        """Just enough of a field: 20 m square onto the whole DAC."""
+        m_vector_scale = 65536/20.0
+        def rescale_array2vector(self, points):
+            return (numpy.asarray(points) + 10.0)*self.m_vector_scale - 32768
+
+    filename = os.path.join(tempfile.gettempdir(), 'pointstream.ild')
+    stream = PointStream(Field(), make_sink('ilda:' + filename))
+    k = 0.5522847498307935
+    for frame in range(10):
+        stream.begin_frame()
+        for (x, y, r) in [(-3.0, 2.0, 0.5), (4.0, -1.0, 1.0)]:
+            a = [(x+r,y), (x+r,y+k*r), (x+k*r,y+r), (x,y+r), (x-k*r,y+r),
+                 (x-r,y+k*r), (x-r,y), (x-r,y-k*r), (x-k*r,y-r), (x,y-r),
+                 (x+k*r,y-r), (x+r,y-k*r)]
+            stream.add_stroke((0.0, 1.0, 0.0),
+                              [[a[i], a[i+1], a[i+2], a[(i+3) % 12]]
+                               for i in (0, 3, 6, 9)])
+        stream.end_frame()
+    stream.close()
+    data = open(filename, 'rb').read()
+    header = ILDA_HEADER.unpack_from(data)
+    print "file:", filename, "bytes:", len(data)
+    print "first header:", header
+    points = numpy.frombuffer(data, ILDA_DTYPE, header[4], ILDA_HEADER.size)
+    print "points:", len(points), "blanked:", \
+          (points['status'] & ILDA_BLANK != 0).sum(), \
+          "x range:", points['x'].min(), points['x'].max()
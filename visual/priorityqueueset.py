@@ -40,7 +40,9 @@ class PriorityQueueSet(object):
         doesn't exist, it's added in O(log N). When it already 
         exists, its priority is checked against the new item's
         priority in O(1). If the new item's priority is smaller,
-        it is updated in the queue. This takes O(N).
+        it is updated in the queue. This also takes O(log N): the
+        new item is pushed with a fresh generation number, and the
+        old heap entry is left to be skipped when it surfaces.
         
         Important: The items you store in the queue have identity
         (that determines when two items are the same, as far as
@@ -67,11 +69,14 @@ class PriorityQueueSet(object):
     def __init__(self):
         """ Create a new PriorityQueueSet
         """
+        # the live entry for each item in the queue
         self.set = {}
-        self.heap = []    
+        # heap of entries, some of them stale
+        self.heap = []
+        self.generation = 0
 
     def __len__(self):
-        return len(self.heap)
+        return len(self.set)
 
     def has_item(self, item):
         """ Check if *item* exists in the queue
@@ -82,9 +87,21 @@ class PriorityQueueSet(object):
         """ Remove and return the smallest item from the queue.
             IndexError will be thrown if the queue is empty.
         """
-        smallest = heapq.heappop(self.heap)
-        del self.set[smallest]
-        return smallest
+        while True:
+            entry = heapq.heappop(self.heap)
+            if self.set.get(entry.item) is entry:
+                del self.set[entry.item]
+                return entry.item
+
+    def _push(self, item):
+        self.generation += 1
+        entry = _Entry(item, self.generation)
+        self.set[item] = entry
+        heapq.heappush(self.heap, entry)
+        # don't let stale entries pile up
+        if len(self.heap) > 2*len(self.set) + 32:
+            self.heap = self.set.values()
+            heapq.heapify(self.heap)
     
     def add(self, item):
         """ Add *item* to the queue. 
@@ -96,23 +113,32 @@ class PriorityQueueSet(object):
         
             Returns True iff the item was added or updated.
         """
-        if not item in self.set:
-            self.set[item] = item
-            heapq.heappush(self.heap, item)
+        if not item in self.set or item < self.set[item].item:
+            self._push(item)
             return True
-        elif item < self.set[item]:
-            # No choice but to search linearly in the heap
-            #
-            for idx, old_item in enumerate(self.heap):
-                if old_item == item:
-                    del self.heap[idx]
-                    self.heap.append(item)
-                    heapq.heapify(self.heap)
-                    self.set[item] = item
-                    return True
-        
+
         return False
-        
+
+
+class _Entry(object):
+    """ A heap entry: an item and the generation it was pushed in.
+
+        Entries order by the item's priority, then by generation, so
+        that a stale entry never gets in the way of a fresh one.
+    """
+    __slots__ = ('item', 'generation')
+
+    def __init__(self, item, generation):
+        self.item = item
+        self.generation = generation
+
+    def __lt__(self, other):
+        if self.item < other.item:
+            return True
+        if other.item < self.item:
+            return False
+        return self.generation < other.generation
+
 
 if __name__ == "__main__":
     import unittest
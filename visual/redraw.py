@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Deciding when shapes need redrawing.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "redraw.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+
+# installed modules
+
+# local modules
+from shared import config
+
+# local classes
+from shared import debug
+
+# constants
+LOGFILE = config.logfile
+
+REDRAW_TOLERANCE = config.redraw_tolerance
+
+# init debugging
+dbug = debug.Debug()
+
+
+def is_changed(old, new, tolerance=REDRAW_TOLERANCE):
+    """Have the inputs to a shape changed enough to redraw it?
+
+    The inputs are numbers, or tuples or lists of them, nested. Numbers
+    have changed if they differ by more than tolerance, anything else if
+    it isn't equal.
+    """
+    if old == new:
+        return False
+    if isinstance(new, (int, float)) and isinstance(old, (int, float)):
+        return abs(new - old) > tolerance
+    if isinstance(new, (tuple, list)) and isinstance(old, (tuple, list)):
+        if len(old) != len(new):
+            return True
+        for (o, n) in zip(old, new):
+            if is_changed(o, n, tolerance):
+                return True
+        return False
+    return True
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Batched screen renderer.
+
+Co-related Space is an interactive multimedia installation that engages the
+themes of presence, interaction, and place. Using motion tracking, laser light
+and a generative soundscape, it encourages interactions between participants,
+visually and sonically transforming a regularly trafficked space. Co-related
+Space highlights participants' active engagement and experimentation with sound
+and light, including complex direct and indirect behavior and relationships.
+
+"""
+
+__appname__ = "renderer.py"
+__author__  = "Wes Modes (modes.io)"
+__version__ = "0.1pre0"
+__license__ = "GNU GPL 3.0 or later"
+
+# core modules
+
+# installed modules
+import pyglet
+
+# local modules
+from shared import config
+
+# local classes
+from shared import debug
+
+# constants
+LOGFILE = config.logfile
+
+# init debugging
+dbug = debug.Debug()
+
+
+class Renderer(object):
+    """Collects everything on the screen into one pyglet batch.
+
+    Each shape (a cell's circle, a connector's line, the guides) owns one
+    indexed vertex list in the batch, keyed by whatever the shape likes,
+    usually itself. When a shape is drawn, its vertex list is updated in
+    place if it is the same size as last frame, and replaced if not. Lists
+    whose shapes weren't drawn this frame are dropped at end_frame. The
+    window then draws the whole batch, which pyglet does with one call per
+    kind of primitive.
+
+    A shape that hasn't changed since it was last drawn (see
+    redraw.is_changed) calls keep instead, and its vertex list stays as
+    it is, so a frame in which nobody moves costs next to nothing here.
+
+    Stores the following values:
+        m_batch: the pyglet batch
+        m_lists: vertex list of each shape, by key
+        m_indices: the index each shape's list was made or last set with
+        m_seen: keys of the shapes drawn this frame
+
+    """
+
+    def __init__(self):
+        self.m_batch = pyglet.graphics.Batch()
+        self.m_lists = {}
+        self.m_indices = {}
+        self.m_seen = set()
+
+    def begin_frame(self):
+        self.m_seen = set()
+
+    def end_frame(self):
+        """Drop the shapes that weren't drawn this frame."""
+        for key in self.m_lists.keys():
+            if key not in self.m_seen:
+                self.m_lists.pop(key).delete()
+                del self.m_indices[key]
+
+    def keep(self, key):
+        """Keep a shape as it was last frame.
+
+        Returns False if we don't have it, and it has to be drawn.
+        """
+        if key not in self.m_lists:
+            return False
+        self.m_seen.add(key)
+        return True
+
+    def lines(self, key, points, index, color):
+        """Draw a shape of line segments.
+
+        args:
+            key - identifies the shape from frame to frame
+            points - (n x 2) array of screen points
+            index - pairs of indices into points, flattened
+            color - (r, g, b)
+        """
+        self.shape(key, pyglet.gl.GL_LINES, points, index, color)
+
+    def triangles(self, key, points, index, color):
+        """Draw a filled shape; index is triples of indices, flattened."""
+        self.shape(key, pyglet.gl.GL_TRIANGLES, points, index, color)
+
+    def shape(self, key, mode, points, index, color):
+        count = len(points)
+        vlist = self.m_lists.get(key)
+        if vlist is not None and (vlist.get_size() != count or
+                                  len(vlist.indices) != len(index) or
+                                  self.m_indices[key][0] != mode):
+            vlist.delete()
+            vlist = None
+        if vlist is None:
+            vlist = self.m_batch.add_indexed(count, mode, None, index,
+                                             'v2i/stream', 'c3f/stream')
+            self.m_lists[key] = vlist
+            self.m_indices[key] = (mode, index)
+        elif self.m_indices[key][1] != index:
+            # the indices in a batch are from the start of the batch's buffer
+            vlist.indices = [vlist.start + i for i in index]
+            self.m_indices[key] = (mode, index)
+        vlist.vertices = points.ravel().tolist()
+        vlist.colors = [color[0], color[1], color[2]]*count
+        self.m_seen.add(key)
+
+    def draw(self):
+        self.m_batch.draw()